@@ -0,0 +1,110 @@
+from typing import List
+
+import numpy
+
+
+def popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def bit_positions(bits: int) -> List[int]:
+    """
+    :return: positions of the set bits, lowest first
+    """
+    positions = []
+    while bits:
+        low = bits & -bits
+        positions.append(low.bit_length() - 1)
+        bits ^= low
+    return positions
+
+
+class AttendanceIndex:
+    """
+    Index of which groups attended which comps, in both directions. Groups and comps are referred to by
+    their row/column numbers in a CircuitView.
+
+    Each group's comps are a bitset (an int with bit i set if the group attended the i-th comp), so
+    shared attendance is a single AND. Each comp's groups are an array of group rows.
+    """
+
+    def __init__(self):
+        self.group_bits: List[int] = []
+        self.comp_groups: List[numpy.ndarray] = []
+
+    @property
+    def num_groups(self) -> int:
+        return len(self.group_bits)
+
+    @property
+    def num_comps(self) -> int:
+        return len(self.comp_groups)
+
+    def add_groups(self, num: int):
+        self.group_bits.extend([0] * num)
+
+    def add_comp(self, rows: List[int]) -> int:
+        """
+        Adds a comp attended by the groups at `rows`.
+        :return: column of the new comp
+        """
+        col = len(self.comp_groups)
+        self.comp_groups.append(numpy.array(rows, dtype=int))
+        bit = 1 << col
+        for row in rows:
+            self.group_bits[row] |= bit
+        return col
+
+    def comps_of(self, row: int) -> List[int]:
+        return bit_positions(self.group_bits[row])
+
+    def groups_at(self, col: int) -> numpy.ndarray:
+        return self.comp_groups[col]
+
+    def shared(self, row_a: int, row_b: int) -> List[int]:
+        """
+        :return: columns of the comps both groups attended
+        """
+        return bit_positions(self.group_bits[row_a] & self.group_bits[row_b])
+
+    def count(self, row: int) -> int:
+        return popcount(self.group_bits[row])
+
+    def counts(self) -> numpy.ndarray:
+        """
+        :return: number of comps attended, per group
+        """
+        counts = numpy.zeros(self.num_groups, dtype=int)
+        for rows in self.comp_groups:
+            counts[rows] += 1
+        return counts
+
+    def total(self) -> int:
+        """
+        :return: total number of (group, comp) attendances
+        """
+        return sum(len(rows) for rows in self.comp_groups)
+
+    def matrix(self) -> numpy.ndarray:
+        """
+        :return: boolean (groups x comps) attendance matrix
+        """
+        matrix = numpy.zeros((self.num_groups, self.num_comps), dtype=bool)
+        for col, rows in enumerate(self.comp_groups):
+            matrix[rows, col] = True
+        return matrix
+
+    @staticmethod
+    def from_matrix(matrix: numpy.ndarray) -> 'AttendanceIndex':
+        index = AttendanceIndex()
+        index.add_groups(matrix.shape[0])
+        for col in range(matrix.shape[1]):
+            index.add_comp(numpy.flatnonzero(matrix[:, col]).tolist())
+        return index
+
+    def copy(self) -> 'AttendanceIndex':
+        index = AttendanceIndex()
+        index.group_bits = list(self.group_bits)
+        # Comp arrays are never modified, so they can be shared
+        index.comp_groups = list(self.comp_groups)
+        return index
@@ -0,0 +1,203 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy
+
+import report_generator
+import score_archive
+import view_format
+from circuit_view import CircuitView, build_totals, build_ragged_totals, get_comps, get_ranks, get_rank_array, \
+    get_stats
+import fake_sheets
+from comp_score_mgr import GSheetsScoreManager, LocalScoreManager
+from synthetic import LatencyScoreManager, generate_season
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+YEAR = "bench"
+
+# Per-fetch latencies (seconds) of the stand-in remote backend
+FETCH_LATENCIES = [0.02, 0.05, 0.1]
+
+# Round trip latency (seconds) of the fake Sheets and Drive services
+SHEETS_LATENCY = 0.05
+
+# (groups, comps, judges, density)
+SCALES = {
+    "small": (30, 7, 5, 0.3),
+    "medium": (150, 12, 8, 0.3),
+    "large": (600, 20, 12, 0.3),
+}
+
+
+@contextlib.contextmanager
+def working_dir(path: str):
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+def timeit(fn: Callable[[], Any], repeat: int) -> float:
+    """
+    :return: best wall time of `repeat` runs, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_scale(groups: int, comps: int, judges: int, density: float, repeat: int,
+                html_groups: int) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as root, working_dir(root):
+        generate_season(root, YEAR, groups, comps, judges, density)
+        order = get_comps(-1, YEAR)
+        score_mgr = LocalScoreManager()
+
+        timings["get_raw_scores"] = timeit(
+            lambda: [score_mgr.get_raw_scores(YEAR, comp) for comp in order], repeat)
+        timings["get_score_matrix"] = timeit(
+            lambda: [score_mgr.get_score_matrix(YEAR, comp) for comp in order], repeat)
+        timings["pack_season"] = timeit(lambda: score_archive.pack_season(YEAR), repeat)
+        # A fresh manager each time, so the archive is opened and mapped again
+        timings["packed_get_many"] = timeit(lambda: score_archive.PackedScoreManager().get_many(YEAR, order), repeat)
+
+        # Serial fetches of a remote backend cost the sum of their latencies, get_many about the slowest
+        remote = LatencyScoreManager(latencies=FETCH_LATENCIES)
+        timings["remote_serial"] = timeit(
+            lambda: [remote.get_score_matrix(YEAR, comp) for comp in order], repeat)
+        timings["remote_get_many"] = timeit(lambda: remote.get_many(YEAR, order), repeat)
+
+        _, sheets, drive, sheet_ids = fake_sheets.from_local(YEAR, SHEETS_LATENCY)
+
+        def sheets_mgr(cache_dir: str) -> GSheetsScoreManager:
+            return GSheetsScoreManager(cache_dir=cache_dir, sheets=sheets, drive=drive, sheet_ids={YEAR: sheet_ids})
+
+        # Cold runs get an empty disk cache each time
+        cold = itertools.count()
+        timings["sheets_serial_cold"] = timeit(
+            lambda: [sheets_mgr(f"sheets_{next(cold)}").get_score_matrix(YEAR, comp) for comp in order], repeat)
+        timings["sheets_get_many_cold"] = timeit(
+            lambda: sheets_mgr(f"sheets_{next(cold)}").get_many(YEAR, order), repeat)
+        warm = sheets_mgr("sheets_warm")
+        warm.get_many(YEAR, order)
+        timings["sheets_get_many_cached"] = timeit(lambda: warm.get_many(YEAR, order), repeat)
+
+        loader = CircuitView()
+        loader.year = YEAR
+        timings["handle_comp"] = timeit(lambda: [loader.handle_comp(comp) for comp in order], repeat)
+
+        view = CircuitView()
+        view.process(-1, YEAR)
+        details = {comp: view.comp_details[comp] for comp in order}
+
+        def dict_stats():
+            raw, normal = build_totals(details)
+            return get_stats(raw), get_stats(normal)
+
+        def ragged_stats():
+            _, raw, normal = build_ragged_totals(details)
+            return raw.medians(), raw.means(), normal.medians(), normal.means()
+
+        timings["build_totals+get_stats"] = timeit(dict_stats, repeat)
+        timings["build_ragged_totals+stats"] = timeit(ragged_stats, repeat)
+
+        amed = dict(view.amed)
+        timings["get_ranks"] = timeit(lambda: get_ranks(amed), repeat)
+        timings["get_rank_array"] = timeit(lambda: get_rank_array(view._stats), repeat)
+
+        timings["process"] = timeit(lambda: CircuitView().process(-1, YEAR), repeat)
+        timings["process_prefixes"] = timeit(lambda: CircuitView.process_prefixes(-1, YEAR), repeat)
+
+        timings["dump"] = timeit(lambda: view.dump("view.json"), repeat)
+        timings["load"] = timeit(lambda: CircuitView.load("view.json"), repeat)
+        timings["save_view"] = timeit(lambda: view_format.save_view(view, "view.cview"), repeat)
+        timings["load_view"] = timeit(lambda: view_format.load_view("view.cview"), repeat)
+
+        runner = report_generator.Runner()
+        runner.comps_18_19 = order
+        runner.comp_names_18_19 = {comp: comp for comp in order}
+        views = [view]
+        report_groups = view.groups[0:html_groups]
+        timings["render_html"] = timeit(
+            lambda: [runner.render_html(views, group) for group in report_groups], repeat) / max(1, len(report_groups))
+
+    return timings
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(scales: List[str], repeat: int, html_groups: int) -> Dict[str, Any]:
+    # The templates are found relative to this file, as benchmarks run in a temporary directory
+    report_generator.TEMPLATES_DIR = os.path.join(HERE, report_generator.TEMPLATES_DIR)
+
+    results = {
+        "revision": revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "scales": {},
+    }
+    for name in scales:
+        groups, comps, judges, density = SCALES[name]
+        print(f"Benchmarking {name}: {groups} groups, {comps} comps, {judges} judges")
+        results["scales"][name] = {
+            "groups": groups, "comps": comps, "judges": judges, "density": density,
+            "timings": bench_scale(groups, comps, judges, density, repeat, html_groups),
+        }
+
+    return results
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]):
+    """
+    Prints the timings of two benchmark runs side by side.
+    """
+    print(f"{old['revision'][0:10]} -> {new['revision'][0:10]}")
+    for scale, result in new["scales"].items():
+        print(f"{scale}:")
+        old_timings = old["scales"].get(scale, {}).get("timings", {})
+        for name, seconds in result["timings"].items():
+            before = old_timings.get(name)
+            ratio = f"{before / seconds:.2f}x" if before and seconds else "-"
+            print(f"\t{name:30} {before if before is not None else float('nan'):10.5f} {seconds:10.5f} {ratio:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline on synthetic seasons")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--html-groups", type=int, default=5)
+    parser.add_argument("--out", default=None, help="JSON file for the results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare(json.load(f_old), json.load(f_new))
+    else:
+        bench_results = run(args.scales, args.repeat, args.html_groups)
+        out = args.out or os.path.join("bench", f"{bench_results['revision'][0:10]}.json")
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump(bench_results, f, indent=4)
+        print("Results written to", out)
@@ -1,17 +1,33 @@
 import os
 import collections
+import collections.abc
+import heapq
 import json
 import numpy
 import itertools
 import csv
-from typing import Type, Dict, List, Any, Tuple
+from typing import Type, Dict, List, Any, Tuple, Callable, Hashable
 
-from comp_score_mgr import LocalScoreManager
+from attendance import AttendanceIndex, bit_positions
+from comp_score_mgr import LocalScoreManager, ScoreManager
+from ragged import RaggedScores
+from running_stats import RunningStats
+from tracing import span, traced
 from util import Group, Score, Stat, Rank, ScoresDict, SCORES_DIR
 
 RAW = "raw"
 NORMAL = "normal"
 
+# Order of the rows in the stats and ranks arrays
+STATS = ("amed", "amean", "rmed", "rmean")
+
+# Tie-breaking methods for ranks; "min" matches the bid-system
+RANK_METHODS = ("min", "dense", "ordinal")
+RANK_METHOD = "min"
+
+# Number of single-judge scores kept on each leaderboard
+LEADERBOARD_SIZE = 10
+
 
 def build_totals(all_scores: Dict[str, Dict[str, ScoresDict]]) -> Tuple[ScoresDict, ScoresDict]:
     """
@@ -25,16 +41,37 @@ def build_totals(all_scores: Dict[str, Dict[str, ScoresDict]]) -> Tuple[ScoresDi
         raw = all_scores[comp]["raw"]
         normal = all_scores[comp]["normal"]
 
-        # TODO nicer reduce function?
         for group in raw:
-            all_raw[group] = (all_raw[group] + raw[group]
-                              ) if group in all_raw else raw[group]
-            all_normal[group] = (
-                all_normal[group] + normal[group]) if group in all_normal else normal[group]
+            all_raw.setdefault(group, []).extend(raw[group])
+            all_normal.setdefault(group, []).extend(normal[group])
 
     return all_raw, all_normal
 
 
+def build_ragged_totals(all_scores: Dict[str, Dict[str, ScoresDict]]
+                        ) -> Tuple[List[Group], RaggedScores, RaggedScores]:
+    """
+    Like build_totals, but builds each of the raw and normalized totals as a single flat array.
+    :param all_scores: all competition scores
+    :return: tuple of [groups (the rows, in order of first appearance), raw scores, normalized scores]
+    """
+    index: Dict[Group, int] = {}
+    raw_parts: List[Tuple[List[int], numpy.ndarray]] = []
+    normal_parts: List[Tuple[List[int], numpy.ndarray]] = []
+    for comp in all_scores:
+        details = all_scores[comp]
+        num_judges = len(details["judge_avgs"])
+        groups, raw = score_matrix(details[RAW], num_judges)
+        _, normal = score_matrix({group: details[NORMAL][group] for group in groups}, num_judges)
+
+        rows = [index.setdefault(group, len(index)) for group in groups]
+        raw_parts.append((rows, raw))
+        normal_parts.append((rows, normal))
+
+    return (list(index.keys()), RaggedScores.build(len(index), raw_parts),
+            RaggedScores.build(len(index), normal_parts))
+
+
 def get_stats(scores: ScoresDict):
     """
     Converts dictionary of scores to dictionaries of median and mean values
@@ -45,82 +82,608 @@ def get_stats(scores: ScoresDict):
     mean: Dict[Group, Stat] = {}
 
     for group in scores:
-        med[group] = Stat(numpy.median(scores[group]))
-        mean[group] = Stat(numpy.mean(scores[group]))
+        group_scores = numpy.asarray(scores[group], dtype=float)
+        med[group] = Stat(numpy.median(group_scores))
+        mean[group] = Stat(group_scores.mean())
 
     return med, mean
 
 
-def get_ranks(stats_map: Dict[Group, Stat]) -> Dict[Group, Rank]:
-    # TODO use pandas rank
-    sorted_by_value = sorted(
-        stats_map.items(), key=lambda kv: kv[1], reverse=True)
-    # start with 1
-    return {tup[0]: (i + 1) for i, tup in enumerate(sorted_by_value)}
+def score_matrix(raw: ScoresDict, num_judges: int) -> Tuple[List[Group], numpy.ndarray]:
+    """
+    Loads a single competition's scores into a dense array.
+    :param raw: dictionary of group to list of judges' scores
+    :param num_judges: number of judges at the competition
+    :return: list of groups (the row index) and a (groups x judges) array of scores
+    """
+    groups = list(raw.keys())
+    scores = numpy.array([raw[group] for group in groups], dtype=float).reshape(len(groups), num_judges)
+
+    return groups, scores
+
+
+def normalize(scores: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Normalizes a (groups x judges) array of scores so that each judge averages to 100.
+    :param scores: raw scores array
+    :return: judge averages, normalized scores array and final (average normalized) score per group
+    """
+    # Reduce over a contiguous axis so the sums match numpy.mean over each judge's list exactly
+    judge_avgs = numpy.ascontiguousarray(scores.T).mean(axis=1)
+    normal = scores * 100 / judge_avgs
+    final_scores = normal.mean(axis=1)
+
+    return judge_avgs, normal, final_scores
+
+
+def get_rank_array(stats: numpy.ndarray, method: str = RANK_METHOD) -> numpy.ndarray:
+    """
+    Ranks values along the last axis, highest value first. Any leading axes are ranked independently in
+    one batch, e.g. a (stats x groups) array or a (samples x stats x groups) array.
+    :param stats: array of stat values
+    :param method: how to rank ties. "min" gives tied values the lowest of their ranks (1, 2, 2, 4),
+    like the bid-system; "dense" doesn't skip ranks after ties (1, 2, 2, 3); "ordinal" gives every value
+    a distinct rank, keeping tied values in their original order (1, 2, 3, 4)
+    :return: array of ranks (starting with 1) of the same shape
+    """
+    if method not in RANK_METHODS:
+        raise Exception("Illegal argument: method")
+
+    # Stable sort keeps equal values in their original order
+    order = numpy.argsort(-stats, axis=-1, kind="stable")
+    positions = numpy.broadcast_to(numpy.arange(1, stats.shape[-1] + 1), stats.shape)
+    if method == "ordinal":
+        sorted_ranks = positions
+    else:
+        # A new rank starts wherever the value differs from the previous one
+        sorted_values = numpy.take_along_axis(stats, order, axis=-1)
+        starts = numpy.ones(stats.shape, dtype=bool)
+        starts[..., 1:] = sorted_values[..., 1:] != sorted_values[..., :-1]
+        if method == "min":
+            sorted_ranks = numpy.maximum.accumulate(numpy.where(starts, positions, 0), axis=-1)
+        else:
+            sorted_ranks = numpy.cumsum(starts, axis=-1)
+
+    ranks = numpy.empty(stats.shape, dtype=int)
+    numpy.put_along_axis(ranks, order, sorted_ranks, axis=-1)
+
+    return ranks
+
+
+def get_ranks(stats_map: Dict[Group, Stat], method: str = RANK_METHOD) -> Dict[Group, Rank]:
+    groups = list(stats_map.keys())
+    ranks = get_rank_array(numpy.array([stats_map[group] for group in groups], dtype=float), method)
+    return {group: int(rank) for group, rank in zip(groups, ranks)}
+
+
+def get_comps(num: int, year: str) -> List[str]:
+    """
+    Converts (num, year) to the first `num` competitions of the year, in order. If num is -1, returns all
+    competitions.
+    """
+    with open(os.path.join(SCORES_DIR, year, "details.json")) as infile:
+        comps = json.load(infile)["order"]
+
+    if num > len(comps):
+        raise Exception("Illegal argument: num")
+
+    if num < 0:
+        num = len(comps)
+
+    return comps[0:num]
+
+
+class ColumnView(collections.abc.Mapping):
+    """
+    Read-only mapping of group to one column (e.g. a stat) stored in a CircuitView array.
+    """
+
+    def __init__(self, index: Dict[Group, int], column: numpy.ndarray, convert=float):
+        self.index = index
+        self.column = column
+        self.convert = convert
+
+    def __getitem__(self, group: Group):
+        return self.convert(self.column[self.index[group]])
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+@traced()
+def load_comp(year: str, comp: str, score_mgr: ScoreManager = None,
+              matrix: Tuple[List[Group], numpy.ndarray] = None
+              ) -> Tuple[List[Group], numpy.ndarray, numpy.ndarray, Dict[str, Any]]:
+    """
+    Loads and normalizes a single competition.
+    :param matrix: the comp's groups and scores if already fetched (e.g. by ScoreManager.get_many)
+    :return: groups, raw and normalized (groups x judges) score arrays, and the competition details:
+    raw and normalized score dictionaries mapping group to list of scores, and per-comp stats
+    """
+    if matrix is None:
+        score_mgr = score_mgr or LocalScoreManager()
+        with span("read_scores", comp=comp):
+            matrix = score_mgr.get_score_matrix(year, comp)
+    groups, scores = matrix
+    raw = dict(zip(groups, scores.tolist()))
+
+    # normalize for each group for this comp
+    with span("normalize", comp=comp):
+        judge_avgs, normal, final_scores = normalize(scores)
+    # TODO judge names
+
+    return groups, scores, normal, {
+        RAW: raw, NORMAL: dict(zip(groups, normal.tolist())),
+        'final_scores': dict(zip(groups, final_scores.tolist())),
+        'max': final_scores.max(), 'min': final_scores.min(), 'judge_avgs': judge_avgs.tolist()}
+
+
+def comp_loader(year: str, comp: str, score_mgr: ScoreManager = None,
+                revision: Hashable = None) -> Callable[[], Dict[str, Any]]:
+    """
+    :param revision: the comp's revision (see ScoreManager.revision) when the view was built; the loader
+    refuses to reload scores that changed since, which would disagree with the view's stats
+    :return: a loader for LazyCompDetails that reloads the comp from its score file
+    """
+    score_mgr = score_mgr or LocalScoreManager()
+
+    def load() -> Dict[str, Any]:
+        if revision is not None and score_mgr.revision(year, comp) != revision:
+            raise Exception(f"Illegal state: scores of {comp} changed since the view was built")
+        return load_comp(year, comp, score_mgr)[3]
+
+    return load
+
+
+class LazyCompDetails(collections.abc.MutableMapping):
+    """
+    Mapping of comp to competition details, where each comp's details are built by a loader on first
+    access (e.g. from the score files or a memory-mapped view file). Loaded details are kept until
+    `release`, and are shared with copies of the mapping. Details can also be set directly, in which
+    case they are never released.
+    """
+
+    def __init__(self, loaders: Dict[str, Callable[[], Dict[str, Any]]],
+                 loaded: Dict[str, Dict[str, Any]] = None):
+        self.loaders = loaders
+        self.loaded = loaded if loaded is not None else {}
+
+    def __getitem__(self, comp: str) -> Dict[str, Any]:
+        if comp not in self.loaders:
+            raise KeyError(comp)
+        if comp not in self.loaded:
+            self.loaded[comp] = self.loaders[comp]()
+        return self.loaded[comp]
+
+    def __setitem__(self, comp: str, details: Dict[str, Any]):
+        self.loaders[comp] = lambda: details
+        self.loaded[comp] = details
+
+    def add(self, comp: str, loader: Callable[[], Dict[str, Any]], details: Dict[str, Any] = None):
+        """
+        Adds a comp with its loader, and optionally its already built details.
+        """
+        self.loaders[comp] = loader
+        if details is not None:
+            self.loaded[comp] = details
+
+    def release(self):
+        """
+        Drops all loaded details; they are loaded again on next access.
+        """
+        self.loaded.clear()
+
+    def __delitem__(self, comp: str):
+        del self.loaders[comp]
+        self.loaded.pop(comp, None)
+
+    def __iter__(self):
+        return iter(self.loaders)
+
+    def __len__(self):
+        return len(self.loaders)
+
+    def copy(self) -> 'LazyCompDetails':
+        # The copy shares loaded details, but adding comps to it doesn't affect this mapping
+        return LazyCompDetails(dict(self.loaders), self.loaded)
+
+
+class Leaderboard:
+    """
+    The top `size` single-judge scores seen so far, kept in a bounded min-heap. Equal scores are ranked by
+    the earliest comp, then the lowest judge, then the group's row in the comp's scores.
+    """
+
+    def __init__(self, size: int = LEADERBOARD_SIZE, entries: List[Dict[str, Any]] = None,
+                 comps: List[str] = None):
+        """
+        :param entries: entries as returned by `top`
+        :param comps: the comps already added (in order), e.g. those of a saved view with `entries`
+        """
+        self.size = size
+        # comp -> position in the order comps were added
+        self.comps: Dict[str, int] = {comp: n for n, comp in enumerate(comps or [])}
+        # (score, -comp position, -judge, -row, group, comp, judge) tuples; the worst entry is at the top of
+        # the heap
+        self.heap: List[Tuple[Score, int, int, int, Group, str, int]] = []
+        # Saved entries are in order, so their position breaks the ties their rows did
+        for i, entry in enumerate(entries or []):
+            self.push((entry["score"], -self.comps.get(entry["comp"], 0), -entry["judge"], -i,
+                       entry["group"], entry["comp"], entry["judge"]))
+
+    def push(self, entry: Tuple[Score, int, int, int, Group, str, int]):
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def add_comp(self, comp: str, groups: List[Group], scores: numpy.ndarray):
+        """
+        Adds the scores from a (groups x judges) array of a single competition.
+        """
+        position = self.comps.setdefault(comp, len(self.comps))
+        flat = scores.ravel()
+        k = min(self.size, flat.size)
+        if k == 0:
+            return
+
+        # Only this comp's top k scores can make the leaderboard; a stable order picks the tied ones
+        rows, judges = numpy.divmod(numpy.arange(flat.size), scores.shape[1])
+        for i in numpy.lexsort((rows, judges, -flat))[0:k]:
+            row, judge = int(rows[i]), int(judges[i])
+            self.push((float(flat[i]), -position, -judge, -row, groups[row], comp, judge))
+
+    def top(self) -> List[Dict[str, Any]]:
+        """
+        :return: the leaderboard entries, highest score first
+        """
+        return [{"score": entry[0], "group": entry[4], "comp": entry[5], "judge": entry[6]}
+                for entry in sorted(self.heap, reverse=True)]
+
+    def copy(self) -> 'Leaderboard':
+        leaderboard = Leaderboard(self.size)
+        leaderboard.comps = dict(self.comps)
+        leaderboard.heap = list(self.heap)
+        return leaderboard
+
+
+class Standings:
+    """
+    Groups ordered by bucket (the worst of their four ranks) and then by name. The groups that qualify at
+    a threshold are a prefix of this order, found with a binary search over the sorted buckets.
+    """
+
+    def __init__(self, groups: List[Group], ranks: numpy.ndarray):
+        self.ranks = ranks
+        buckets = ranks.max(axis=0) if len(groups) else numpy.zeros(0, dtype=int)
+        order = numpy.lexsort((numpy.array(groups, dtype=str), buckets))
+        self.groups: List[Group] = [groups[i] for i in order]
+        self.sorted_buckets: numpy.ndarray = buckets[order]
+
+    def count(self, threshold: int) -> int:
+        """
+        :return: number of groups qualifying at `threshold`
+        """
+        return int(numpy.searchsorted(self.sorted_buckets, threshold, side="right"))
+
+    def select(self, threshold: int) -> List[Group]:
+        return self.groups[0:self.count(threshold)]
+
+    def sweep(self, thresholds: List[int]) -> Dict[int, List[Group]]:
+        counts = numpy.searchsorted(self.sorted_buckets, thresholds, side="right")
+        return {threshold: self.groups[0:count] for threshold, count in zip(thresholds, counts)}
+
+    def buckets(self) -> Dict[Rank, List[Group]]:
+        """
+        :return: ordered dictionary of bucket to the groups in it, sorted by name
+        """
+        values, starts = numpy.unique(self.sorted_buckets, return_index=True)
+        ends = list(starts[1:]) + [len(self.groups)]
+        return collections.OrderedDict(
+            (int(value), self.groups[start:end]) for value, start, end in zip(values, starts, ends))
 
 
 class CircuitView:
     """
     Represents the state of the circuit.
+
+    Groups are interned to row numbers (`_index`). Stats and ranks are stored as (4 x groups) arrays in
+    `STATS` order, and attendance as an `AttendanceIndex`. The dict-like attributes (`amed`,
+    `amed_rank`, `attended`, ...) are read-only views over these arrays.
     """
 
+    def __init__(self, rank_method: str = RANK_METHOD, score_mgr: ScoreManager = None):
+        self.rank_method = rank_method
+        # Source of the comps' scores; share a CachingScoreManager between views to parse each comp once
+        self.score_mgr = score_mgr or LocalScoreManager()
+        self.year: str = None
+        self.comps: List[str] = []
+        self.comp_details = LazyCompDetails({})
+        self.groups: List[Group] = []
+        self._index: Dict[Group, int] = {}
+        self._stats = numpy.zeros((len(STATS), 0))
+        self._ranks = numpy.zeros((len(STATS), 0), dtype=int)
+        self._attendance = AttendanceIndex()
+        self._standings: Standings = None
+        # Row -> running stats for append_comp; a group's are built when a comp it attends is appended
+        self._running: Dict[int, Tuple[RunningStats, RunningStats]] = {}
+        self.avg_groups_per_comp = 0.0
+        self.avg_judges_per_comp = 0.0
+        self.avg_comps_per_group = 0.0
+        # Top single-judge raw and normalized scores, updated as comps are loaded
+        self.leaderboards = {RAW: Leaderboard(), NORMAL: Leaderboard()}
+
+    @property
+    def best_score(self) -> Dict[str, Any]:
+        """
+        The best single-judge raw score, as a dict of score, group, comp and judge (index)
+        """
+        top = self.leaderboards[RAW].top()
+        return top[0] if top else None
+
+    @property
+    def amed(self) -> ColumnView:
+        return ColumnView(self._index, self._stats[0])
+
+    @property
+    def amean(self) -> ColumnView:
+        return ColumnView(self._index, self._stats[1])
+
+    @property
+    def rmed(self) -> ColumnView:
+        return ColumnView(self._index, self._stats[2])
+
+    @property
+    def rmean(self) -> ColumnView:
+        return ColumnView(self._index, self._stats[3])
+
+    @property
+    def amed_rank(self) -> ColumnView:
+        return ColumnView(self._index, self._ranks[0], int)
+
+    @property
+    def amean_rank(self) -> ColumnView:
+        return ColumnView(self._index, self._ranks[1], int)
+
+    @property
+    def rmed_rank(self) -> ColumnView:
+        return ColumnView(self._index, self._ranks[2], int)
+
+    @property
+    def rmean_rank(self) -> ColumnView:
+        return ColumnView(self._index, self._ranks[3], int)
+
+    @property
+    def attended(self) -> ColumnView:
+        return ColumnView(self._index, self._attendance.group_bits, self._attended_comps)
+
+    def _attended_comps(self, bits: int) -> List[str]:
+        return [self.comps[i] for i in bit_positions(bits)]
+
+    def attendance_counts(self) -> Dict[Group, int]:
+        """
+        :return: number of comps attended, per group
+        """
+        return dict(zip(self.groups, self._attendance.counts().tolist()))
+
+    def groups_at(self, comp: str) -> List[Group]:
+        """
+        :return: groups that attended `comp`
+        """
+        return [self.groups[row] for row in self._attendance.groups_at(self.comps.index(comp))]
+
+    def shared_comps(self, group_a: Group, group_b: Group) -> List[str]:
+        """
+        :return: comps that both groups attended, in order
+        """
+        if group_a not in self._index or group_b not in self._index:
+            return []
+        return [self.comps[i] for i in self._attendance.shared(self._index[group_a], self._index[group_b])]
+
+    def _set_groups(self, groups: List[Group]):
+        self.groups = groups
+        self._index = {group: i for i, group in enumerate(groups)}
+
+    def _add_groups(self, groups: List[Group]):
+        """
+        Interns new groups, adding empty rows for them to every array.
+        """
+        for group in groups:
+            self._index[group] = len(self.groups)
+            self.groups.append(group)
+
+        self._stats = numpy.pad(self._stats, ((0, 0), (0, len(groups))))
+        self._ranks = numpy.pad(self._ranks, ((0, 0), (0, len(groups))))
+        self._attendance.add_groups(len(groups))
+
+    def _running_stats(self, rows: List[int]) -> List[Tuple[RunningStats, RunningStats]]:
+        """
+        :return: raw and normalized running stats of the groups at `rows`. Stats of a group that has none
+        yet (e.g. in a copied or loaded view) are built from the details of the comps it attended.
+        """
+        missing = [row for row in rows if row not in self._running]
+        comp_rows: Dict[int, List[int]] = collections.defaultdict(list)
+        for row in missing:
+            self._running[row] = (RunningStats(), RunningStats())
+            for i in self._attendance.comps_of(row):
+                comp_rows[i].append(row)
+
+        # Each comp's details are read once, for all of its groups that need stats. Scores are added in
+        # comp order, so means sum in the same order (and ties rank the same) as when appended one by one.
+        for i, comp_rows_i in sorted(comp_rows.items()):
+            details = self.comp_details[self.comps[i]]
+            for row in comp_rows_i:
+                raw, normal = self._running[row]
+                raw.extend(details[RAW][self.groups[row]])
+                normal.extend(details[NORMAL][self.groups[row]])
+
+        return [self._running[row] for row in rows]
+
+    @traced()
     def process(self, num: int, year: str):
         """
         Process competition scores to produce a CircuitView. `num` is the number of competitions to
         process. If num is -1, processes all competitions. `year` is the year to process.
         """
         self.year = year
+        self.comps = get_comps(num, year)
 
-        # First, convert (num, year) to comps
-        with open(os.path.join(SCORES_DIR, year, "details.json")) as infile:
-            _comps = json.load(infile)["order"]
+        print("comps:")
+        print(self.comps)
 
-        if num > len(_comps):
-            raise Exception("Illegal argument: num")
+        # Fetch every comp up front, so remote backends can fetch them concurrently or in bulk
+        with span("prefetch", comps=len(self.comps)):
+            revisions = self.score_mgr.revisions(year, self.comps)
+            matrices = self.score_mgr.get_many(year, self.comps, revisions)
 
-        if num < 0:
-            num = len(_comps)
+        self.leaderboards = {RAW: Leaderboard(), NORMAL: Leaderboard()}
+        self.comp_details = LazyCompDetails({})
+        for comp in self.comps:
+            self.comp_details.add(comp, comp_loader(year, comp, self.score_mgr, revisions[comp]),
+                                  self.handle_comp(comp, matrices[comp]))
 
-        self.comps = _comps[0:num]
+        self.summarize()
 
-        print("comps:")
-        print(self.comps)
+    @staticmethod
+    @traced()
+    def process_prefixes(num: int, year: str, score_mgr: ScoreManager = None) -> List['CircuitView']:
+        """
+        Process competition scores to produce one CircuitView per prefix of the competition order, i.e.
+        the views after the first competition, the first two competitions, and so on up to `num` (-1 for
+        all). Each competition is loaded and normalized only once. Competition details are released
+        afterwards, so the views only hold their summaries until details are accessed again.
+        """
+        view = CircuitView(score_mgr=score_mgr)
+        view.year = year
+        comps = get_comps(num, year)
 
-        self.comp_details: Dict[str, Dict[str, Any]] = {
-            comp: self.handle_comp(comp) for comp in self.comps
-        }
+        with span("prefetch", comps=len(comps)):
+            revisions = view.score_mgr.revisions(year, comps)
+            matrices = view.score_mgr.get_many(year, comps, revisions)
+
+        views: List[CircuitView] = []
+        for comp in comps:
+            view.append_comp(comp, matrices[comp], revisions[comp])
+            views.append(view.copy())
+
+        # The views share their details, so this releases them for all views
+        view.release_comp_details()
+
+        return views
+
+    def release_comp_details(self):
+        """
+        Drops loaded competition details from memory. They are loaded again (from the score files or the
+        view file) when accessed.
+        """
+        self.comp_details.release()
+
+    def copy(self) -> 'CircuitView':
+        """
+        Copies this view. Competition details are shared, everything else is copied.
+        """
+        cv = CircuitView(self.rank_method, self.score_mgr)
+        cv.year = self.year
+        cv.comps = list(self.comps)
+        cv.comp_details = self.comp_details.copy()
+        cv._set_groups(list(self.groups))
+        cv._stats = self._stats.copy()
+        cv._ranks = self._ranks.copy()
+        cv._attendance = self._attendance.copy()
+        cv.avg_groups_per_comp = self.avg_groups_per_comp
+        cv.avg_judges_per_comp = self.avg_judges_per_comp
+        cv.avg_comps_per_group = self.avg_comps_per_group
+        cv.leaderboards = {kind: leaderboard.copy() for kind, leaderboard in self.leaderboards.items()}
 
+        return cv
+
+    @traced()
+    def summarize(self):
+        """
+        Computes totals, stats, ranks and misc. stats from the loaded competition details.
+        """
         # build normals
-        raw, normal = build_totals(self.comp_details)
-        self.groups = list(raw.keys())
+        with span("totals"):
+            groups, raw, normal = build_ragged_totals(
+                {comp: self.comp_details[comp] for comp in self.comps})
+        self._set_groups(groups)
+        self._running = {}
 
-        # evaluate numbers
-        self.amed, self.amean = get_stats(raw)
-        self.rmed, self.rmean = get_stats(normal)
+        # evaluate numbers, in STATS order
+        with span("stats"):
+            self._stats = numpy.array([raw.medians(), raw.means(), normal.medians(), normal.means()])
 
         # get ranks
-        self.amed_rank = get_ranks(self.amed)
-        self.amean_rank = get_ranks(self.amean)
-        self.rmed_rank = get_ranks(self.rmed)
-        self.rmean_rank = get_ranks(self.rmean)
+        with span("ranks"):
+            self._ranks = get_rank_array(self._stats, self.rank_method)
 
         # compute misc. stats
-        self.attended: Dict[Group, List[str]] = {
-            group: [
-                comp for comp in self.comps if group in self.comp_details[comp][RAW]]
-            for group in self.groups
-        }
+        with span("attendance"):
+            self._attendance = AttendanceIndex()
+            self._attendance.add_groups(len(self.groups))
+            for comp in self.comps:
+                self._attendance.add_comp([self._index[group] for group in self.comp_details[comp][RAW]])
+
         self.avg_groups_per_comp = numpy.mean(
             [len(self.comp_details[comp][RAW]) for comp in self.comp_details])
         self.avg_judges_per_comp = numpy.mean(
             [len(self.comp_details[comp]["judge_avgs"]) for comp in self.comp_details])
-        self.avg_comps_per_group = numpy.mean(
-            [len(self.attended[group]) for group in self.groups])
-        self.best_score = {
-            "group": "Lel",
-            "comp": "Lol",
-            "score": 420.69
-        }
+        self.avg_comps_per_group = numpy.mean(self._attendance.counts())
+
+    @traced()
+    def append_comp(self, comp: str, matrix: Tuple[List[Group], numpy.ndarray] = None,
+                    revision: Hashable = None):
+        """
+        Folds one more competition into an already processed (or loaded) view. The scores of the groups
+        that attended `comp` are streamed into their running stats, so a group's stats are updated in
+        O(log n) per score; ranks and misc. stats are updated in place.
+        :param comp: name of comp
+        :param matrix: the comp's groups and scores if already fetched
+        :param revision: the revision `matrix` was fetched at; looked up here if the scores are read here
+        """
+        if comp in self.comp_details:
+            raise Exception("Illegal argument: comp")
+        if matrix is None and revision is None:
+            revision = self.score_mgr.revision(self.year, comp)
+
+        details = self.handle_comp(comp, matrix)
+        num_comps = len(self.comps)
+        num_attendances = self._attendance.total()
+
+        with span("attendance", comp=comp):
+            self._add_groups([group for group in details[RAW] if group not in self._index])
+            rows = [self._index[group] for group in details[RAW]]
+            # Built from the comps before this one, so only for the groups attending it
+            running = self._running_stats(rows)
+            self._attendance.add_comp(rows)
+
+        self.comps.append(comp)
+        self.comp_details.add(comp, comp_loader(self.year, comp, self.score_mgr, revision), details)
+
+        with span("stats", comp=comp):
+            for i, (group, row) in enumerate(zip(details[RAW], rows)):
+                # Only this group's stats change, and only by the new scores
+                raw, normal = running[i]
+                raw.extend(details[RAW][group])
+                normal.extend(details[NORMAL][group])
+                self._stats[:, row] = (raw.median(), raw.mean(), normal.median(), normal.mean())
+
+        with span("ranks", comp=comp):
+            self._ranks = get_rank_array(self._stats, self.rank_method)
+
+        # Running averages over comps and groups
+        if num_comps == 0:
+            self.avg_groups_per_comp = float(len(details[RAW]))
+            self.avg_judges_per_comp = float(len(details["judge_avgs"]))
+        else:
+            self.avg_groups_per_comp = (self.avg_groups_per_comp * num_comps + len(details[RAW])) / (
+                num_comps + 1)
+            self.avg_judges_per_comp = (self.avg_judges_per_comp * num_comps + len(
+                details["judge_avgs"])) / (num_comps + 1)
+        self.avg_comps_per_group = (num_attendances + len(details[RAW])) / len(self.groups)
 
     # TODO look up a better way to persist python classes to files
     @staticmethod
@@ -128,56 +691,98 @@ class CircuitView:
         with open(filename, 'r') as f:
             d = json.load(f)
 
-        cv = CircuitView()
+        # Views from before ranks handled ties were ranked in order
+        cv = CircuitView(d.get('rank_method', "ordinal"))
         cv.year = d['year']
         cv.comps = d['comps']
-        cv.comp_details = d['comp_details']
-        cv.groups = d['groups']
-        cv.amed = d['amed']
-        cv.amean = d['amean']
-        cv.rmed = d['rmed']
-        cv.rmean = d['rmean']
-        cv.amed_rank = d['amed_rank']
-        cv.amean_rank = d['amean_rank']
-        cv.rmed_rank = d['rmed_rank']
-        cv.rmean_rank = d['rmean_rank']
-        cv.attended = d['attended']
+        for comp in cv.comps:
+            cv.comp_details[comp] = d['comp_details'][comp]
+        cv._set_groups(d['groups'])
+        cv._stats = numpy.array([[d[stat][group] for group in cv.groups] for stat in STATS],
+                                dtype=float).reshape(len(STATS), -1)
+        cv._ranks = numpy.array([[d[f"{stat}_rank"][group] for group in cv.groups] for stat in STATS],
+                                dtype=int).reshape(len(STATS), -1)
+        cv._attendance = AttendanceIndex()
+        cv._attendance.add_groups(len(cv.groups))
+        comp_rows: Dict[str, List[int]] = {comp: [] for comp in cv.comps}
+        for group, comps in d['attended'].items():
+            for comp in comps:
+                comp_rows[comp].append(cv._index[group])
+        for comp in cv.comps:
+            cv._attendance.add_comp(comp_rows[comp])
         cv.avg_groups_per_comp = d['avg_groups_per_comp']
         cv.avg_judges_per_comp = d['avg_judges_per_comp']
         cv.avg_comps_per_group = d['avg_comps_per_group']
-        cv.best_score = d['best_score']
+        if 'leaderboards' in d:
+            cv.leaderboards = {kind: Leaderboard(entries=entries, comps=cv.comps)
+                               for kind, entries in d['leaderboards'].items()}
+        else:
+            # Views saved before leaderboards existed still have every comp's scores
+            for comp in cv.comps:
+                details = cv.comp_details[comp]
+                num_judges = len(details["judge_avgs"])
+                for kind in (RAW, NORMAL):
+                    groups, scores = score_matrix(details[kind], num_judges)
+                    cv.leaderboards[kind].add_comp(comp, groups, scores)
 
         return cv
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: this view as plain dicts and lists, in the format read by `load`
+        """
+        d: Dict[str, Any] = {
+            'year': self.year,
+            'comps': self.comps,
+            'comp_details': {comp: self.comp_details[comp] for comp in self.comps},
+            'groups': self.groups,
+        }
+        for stat in STATS:
+            d[stat] = dict(getattr(self, stat))
+        for stat, ranks in zip(STATS, self._ranks):
+            # Ordered by rank, as get_ranks builds them
+            d[f"{stat}_rank"] = {self.groups[i]: int(ranks[i])
+                                 for i in numpy.argsort(ranks, kind="stable")}
+        d['attended'] = dict(self.attended)
+        d['avg_groups_per_comp'] = float(self.avg_groups_per_comp)
+        d['avg_judges_per_comp'] = float(self.avg_judges_per_comp)
+        d['avg_comps_per_group'] = float(self.avg_comps_per_group)
+        d['best_score'] = self.best_score
+        d['leaderboards'] = {kind: leaderboard.top() for kind, leaderboard in self.leaderboards.items()}
+        d['rank_method'] = self.rank_method
+
+        return d
+
     def dump(self, filename: str):
         with open(filename, 'w') as f:
-            json.dump(self.__dict__, f, indent=4)
+            json.dump(self.to_dict(), f, indent=4)
+
+    @property
+    def standings(self) -> 'Standings':
+        # Ranks are replaced rather than modified, so the standings are current while they match
+        if self._standings is None or self._standings.ranks is not self._ranks:
+            self._standings = Standings(self.groups, self._ranks)
+        return self._standings
 
     def select_groups(self, threshold: int):
         """
-        Select groups given a threshold.
+        Select groups given a threshold, ordered by bucket and then by group name.
         """
-        return [t for t in self.groups if self.amed_rank[t] <= threshold and self.amean_rank[t] <= threshold and self.rmed_rank[t] <= threshold and self.rmean_rank[t] <= threshold]
+        return self.standings.select(threshold)
+
+    def sweep_standings(self, thresholds: List[int]) -> Dict[int, List[Group]]:
+        """
+        Selects groups for every threshold in `thresholds`.
+        """
+        return self.standings.sweep(thresholds)
 
     def get_standings(self):
         """
         Returns an ordered dictionary of all of the thresholded groups.
         """
-        buckets: Dict[float, List[str]] = {}
         print(f"{len(self.groups)} total groups")
 
-        # Bucketize all groups
-        for group in self.groups:
-            bucket: Rank = max(self.amed_rank[group], self.amean_rank[group], self.rmed_rank[group],
-                               self.rmean_rank[group])
-            buckets[bucket] = (buckets[bucket] + [group]
-                               ) if bucket in buckets else [group]
-
-        # Sort each bucket by group name
-        buckets = {key: sorted(value) for (key, value) in buckets.items()}
-
-        # Convert to OrderedDict for output
-        return collections.OrderedDict(sorted(iter(buckets.items())))
+        return self.standings.buckets()
 
     def save_standings(self, ordered_buckets: collections.OrderedDict, filename: str):
         """
@@ -190,56 +795,42 @@ class CircuitView:
                 outfile.write(
                     f"{bucket},{' '.join(ordered_buckets[bucket])}\n")
 
+    @staticmethod
+    def standings_json(ordered_buckets: collections.OrderedDict) -> List[Dict[str, Any]]:
+        """
+        :return: the standings as saved by save_standings_json
+        """
+        return [
+            {
+                "threshold": bucket,
+                "groups": ordered_buckets[bucket]
+            }
+            for bucket in ordered_buckets
+        ]
+
     def save_standings_json(self, ordered_buckets: collections.OrderedDict, filename: str):
         with open(filename, mode="w") as outfile:
-            json.dump([
-                {
-                    "threshold": bucket,
-                    "groups": ordered_buckets[bucket]
-                }
-                for bucket in ordered_buckets
-            ], outfile)
+            json.dump(self.standings_json(ordered_buckets), outfile)
 
     def get_group_stats(self, group: Group):
-        return {
-            "amed": self.amed[group] if group in self.amed else 0,
-            "amean": self.amean[group] if group in self.amean else 0,
-            "rmed": self.rmed[group] if group in self.rmed else 0,
-            "rmean": self.rmean[group] if group in self.rmean else 0,
-        }
+        stats = self._stats[:, self._index[group]] if group in self._index else [0] * len(STATS)
+        return {stat: float(value) for stat, value in zip(STATS, stats)}
 
     def get_group_ranks(self, group: Group):
-        return {
-            "amed": self.amed_rank[group] if group in self.amed_rank else len(self.groups) + 1,
-            "amean": self.amean_rank[group] if group in self.amean_rank else len(self.groups) + 1,
-            "rmed": self.rmed_rank[group] if group in self.rmed_rank else len(self.groups) + 1,
-            "rmean": self.rmean_rank[group] if group in self.rmean_rank else len(self.groups) + 1,
-            "total": len(self.groups),
-        }
+        total = len(self.groups)
+        ranks = self._ranks[:, self._index[group]] if group in self._index else [total + 1] * len(STATS)
+        return {**{stat: int(rank) for stat, rank in zip(STATS, ranks)}, "total": total}
 
-    def handle_comp(self, comp: str) -> Dict[str, Any]:
+    @traced()
+    def handle_comp(self, comp: str, matrix: Tuple[List[Group], numpy.ndarray] = None) -> Dict[str, Any]:
         """
-        Handles a single competition.
+        Handles a single competition, adding its scores to the leaderboards.
         :param comp: name of comp
+        :param matrix: the comp's groups and scores if already fetched
         :return: raw and normalized score dictionary, mapping group to list of scores for this comp
         """
-        score_mgr = LocalScoreManager()
-
-        raw, num_judges = score_mgr.get_raw_scores(self.year, comp)
-
-        # normalize for each group for this comp
-        judge_avgs = [numpy.mean([raw[group][i] for group in raw])
-                      for i in range(num_judges)]
-
-        normal = {group: [x * 100 / judge_avgs[i]
-                          for i, x in enumerate(raw[group])] for group in raw}
-
-        final_scores = {group: numpy.average(
-            normal[group]) for group in normal}
-        final_scores_list = final_scores.values()
-        comp_max = max(final_scores_list)
-        comp_min = min(final_scores_list)
-        # TODO judge names
+        groups, scores, normal, details = load_comp(self.year, comp, self.score_mgr, matrix)
+        self.leaderboards[RAW].add_comp(comp, groups, scores)
+        self.leaderboards[NORMAL].add_comp(comp, groups, normal)
 
-        return {RAW: raw, NORMAL: normal, 'final_scores': final_scores, 'max': comp_max, 'min': comp_min,
-                'judge_avgs': judge_avgs}
+        return details
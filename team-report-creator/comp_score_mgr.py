@@ -1,61 +1,429 @@
 import abc
-import itertools
+import concurrent.futures
 import csv
+import hashlib
+import itertools
 import os
 import json
+import pathlib
+import threading
 from googleapiclient.discovery import build
-from typing import Tuple
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy
+from cachetools import LRUCache
 
 from google_helper import get_creds
-from util import ScoresDict, SCORES_DIR
+from util import Group, ScoresDict, SCORES_DIR
+
+
+# Memory bound of CachingScoreManager's score arrays
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Concurrent fetches of ScoreManager.get_many
+DEFAULT_FETCH_WORKERS = 8
+
+# Name of the sheet with the scores in each comp's spreadsheet
+SHEET_CALC = "Calculator"
+
+# Requests per HTTP batch to the Google APIs
+SHEETS_BATCH_SIZE = 50
+
+# Parsed sheets, by revision (sheet ID and Drive version)
+SHEETS_CACHE_DIR = os.path.join("cache", "sheets")
+
+
+class ScoreFormatError(ValueError):
+    """
+    A malformed score file. The message points at the offending line as file:line.
+    """
+
+    def __init__(self, path: str, line: int, message: str):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
 
 
 class ScoreManager(abc.ABC):
+    # Threads of the default get_many
+    max_workers = DEFAULT_FETCH_WORKERS
+
     @abc.abstractclassmethod
     def get_raw_scores(self, year: str, name: str) -> Tuple[ScoresDict, int]:
         pass
 
+    def get_score_matrix(self, year: str, name: str) -> Tuple[List[Group], numpy.ndarray]:
+        """
+        :return: list of groups and a (groups x judges) array of their scores
+        """
+        raw, num_judges = self.get_raw_scores(year, name)
+        groups = list(raw.keys())
+        return groups, numpy.array([raw[group] for group in groups], dtype=float).reshape(len(groups), num_judges)
+
+    def revision(self, year: str, name: str) -> Hashable:
+        """
+        :return: a JSON-serializable value that changes whenever the comp's scores change (ViewCache keys
+        views by it), or None if unknown
+        """
+        return None
+
+    def revisions(self, year: str, names: List[str]) -> Dict[str, Hashable]:
+        """
+        :return: the revision of every comp; backends that look revisions up remotely should override
+        this with a bulk request
+        """
+        return {name: self.revision(year, name) for name in names}
+
+    def get_many(self, year: str, names: List[str], revisions: Dict[str, Hashable] = None
+                 ) -> Dict[str, Tuple[List[Group], numpy.ndarray]]:
+        """
+        Fetches several comps, concurrently on up to `max_workers` threads. Backends with a bulk request
+        should override this.
+        :param revisions: the comps' revisions if already looked up, for backends that need them to fetch
+        :return: dictionary of comp to its groups and (groups x judges) scores
+        """
+        workers = min(self.max_workers, len(names))
+        if workers <= 1:
+            return {name: self.get_score_matrix(year, name) for name in names}
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            return dict(zip(names, pool.map(lambda name: self.get_score_matrix(year, name), names)))
+
+
+def parse_scores(path: str, text: str) -> Tuple[List[Group], numpy.ndarray]:
+    """
+    Parses a comp's score file: one row per group of its name followed by each judge's score.
+    The whole file is split at once and its scores converted straight into one array.
+    :param path: file name, for errors
+    :return: list of groups and a (groups x judges) array of scores
+    """
+    lines = text.splitlines()
+    numbers = range(1, len(lines) + 1)
+    if not all(line.strip() for line in lines):
+        # Skip blank lines, but keep the line numbers of the others for errors
+        numbered = [(n, line) for n, line in zip(numbers, lines) if line.strip()]
+        numbers, lines = [n for n, _ in numbered], [line for _, line in numbered]
+    if not lines:
+        return [], numpy.zeros((0, 0))
+
+    if '"' in text:
+        # Quoted group names may contain commas
+        rows = list(csv.reader(lines))
+        groups = [row[0] for row in rows]
+        widths = [len(row) - 1 for row in rows]
+        cells = [cell for row in rows for cell in row[1:]]
+    else:
+        widths = [line.count(",") for line in lines]
+        cells = ",".join(lines).split(",")
+        groups = cells[0::widths[0] + 1]
+        # Every cell but the group names
+        cells = itertools.compress(cells, itertools.cycle([False] + [True] * widths[0]))
+
+    num_judges = widths[0]
+    if num_judges == 0:
+        raise ScoreFormatError(path, numbers[0], "no scores")
+    for n, width in zip(numbers, widths):
+        if width != num_judges:
+            raise ScoreFormatError(path, n, f"expected {num_judges} scores, found {width}")
+
+    try:
+        scores = numpy.fromiter(map(float, cells), float, len(lines) * num_judges)
+    except ValueError:
+        scores = None
+    # nan and inf parse as floats but aren't scores
+    if scores is None or not numpy.isfinite(scores).all():
+        for n, row in zip(numbers, csv.reader(lines)):
+            for cell in row[1:]:
+                try:
+                    valid = numpy.isfinite(float(cell))
+                except ValueError:
+                    valid = False
+                if not valid:
+                    raise ScoreFormatError(path, n, f"invalid score {cell.strip()!r}")
+
+    seen = set()
+    for n, group in zip(numbers, groups):
+        if group in seen:
+            raise ScoreFormatError(path, n, f"duplicate group {group!r}")
+        seen.add(group)
+
+    return groups, scores.reshape(len(lines), num_judges)
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
 
 class LocalScoreManager(ScoreManager):
+    def __init__(self):
+        # path -> (mtime, size, digest) of the file's current contents, so unchanged files are only hashed once
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def get_score_matrix(self, year: str, name: str) -> Tuple[List[Group], numpy.ndarray]:
+        """
+        :return: list of groups and a (groups x judges) array of their scores
+        """
+        path = os.path.join(SCORES_DIR, year, f"{name}.csv")
+        with open(path, mode='r') as infile:
+            return parse_scores(path, infile.read())
+
+    def get_raw_scores(self, year: str, name: str) -> Tuple[ScoresDict, int]:
+        groups, scores = self.get_score_matrix(year, name)
+
+        # raw judges' scores per group
+        return dict(zip(groups, scores.tolist())), scores.shape[1]
+
+    def revision(self, year: str, name: str) -> Hashable:
+        """
+        :return: the SHA-256 of the score file, so a file that's touched but not changed keeps its revision
+        """
+        path = os.path.join(SCORES_DIR, year, f"{name}.csv")
+        st = os.stat(path)
+        entry = self._digests.get(path)
+        if entry is None or entry[0:2] != (st.st_mtime_ns, st.st_size):
+            entry = self._digests[path] = st.st_mtime_ns, st.st_size, file_digest(path)
+        return entry[2]
+
+
+class CachingScoreManager(ScoreManager):
+    """
+    Keeps the score arrays of recently used comps of another ScoreManager in memory, so one instance can
+    serve every view of a run or a long-lived service. Entries are checked against the backend's revision
+    of the comp (e.g. the digest of its score file) on every access and refetched when it
+    changed; backends without revisions are cached until evicted. Cached arrays are read-only.
+    """
+
+    def __init__(self, score_mgr: ScoreManager, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.score_mgr = score_mgr
+        # (year, name) -> (revision, groups, scores), least recently used evicted first
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=lambda entry: entry[2].nbytes + 1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_score_matrix(self, year: str, name: str) -> Tuple[List[Group], numpy.ndarray]:
+        revision = self.score_mgr.revision(year, name)
+        with self._lock:
+            entry = self._cache.get((year, name))
+            if entry is not None and entry[0] == revision:
+                self.hits += 1
+                return list(entry[1]), entry[2]
+            self.misses += 1
+
+        groups, scores = self.score_mgr.get_score_matrix(year, name)
+        scores.flags.writeable = False
+        with self._lock:
+            self._cache[year, name] = (revision, groups, scores)
+
+        return list(groups), scores
+
     def get_raw_scores(self, year: str, name: str) -> Tuple[ScoresDict, int]:
-        with open(os.path.join(SCORES_DIR, year, f"{name}.csv"), mode='r') as infile:
-            # Trick to calculate the number of judges ahead of time
-            col_reader, reader = itertools.tee(csv.reader(infile))
+        groups, scores = self.get_score_matrix(year, name)
+        return dict(zip(groups, scores.tolist())), scores.shape[1]
+
+    def revision(self, year: str, name: str) -> Hashable:
+        return self.score_mgr.revision(year, name)
+
+    def revisions(self, year: str, names: List[str]) -> Dict[str, Hashable]:
+        return self.score_mgr.revisions(year, names)
+
+    def get_many(self, year: str, names: List[str], revisions: Dict[str, Hashable] = None
+                 ) -> Dict[str, Tuple[List[Group], numpy.ndarray]]:
+        """
+        Serves cached comps from memory and fetches the rest with one get_many of the wrapped manager,
+        passing on the revisions so they're only looked up once.
+        """
+        if revisions is None:
+            revisions = self.score_mgr.revisions(year, names)
+        matrices = {}
+        with self._lock:
+            for name in names:
+                entry = self._cache.get((year, name))
+                if entry is not None and entry[0] == revisions[name]:
+                    self.hits += 1
+                    matrices[name] = (list(entry[1]), entry[2])
+            missing = [name for name in names if name not in matrices]
+            self.misses += len(missing)
 
-            num_judges = len(next(col_reader)) - 1
-            del col_reader
+        if missing:
+            fetched = self.score_mgr.get_many(year, missing, {name: revisions[name] for name in missing})
+            with self._lock:
+                for name in missing:
+                    groups, scores = fetched[name]
+                    scores.flags.writeable = False
+                    self._cache[year, name] = (revisions[name], groups, scores)
+                    matrices[name] = (list(groups), scores)
 
-            # raw judges' scores per group
-            raw = {oScores[0]: [float(x) for x in oScores[1:]]
-                   for oScores in reader}
+        return {name: matrices[name] for name in names}
 
-        return raw, num_judges
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache),
+                    "bytes": int(self._cache.currsize)}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def parse_calculator(cells: List[List[Any]], path: str) -> Tuple[List[Group], numpy.ndarray]:
+    """
+    Parses the values of a comp's Calculator sheet (see spreadsheet_creator.calculator_sheet): two header
+    rows, then one row per group of its name, each judge's raw score, the converted scores and the
+    results. The raw scores are the last "... Scores" columns before "Converted Scores", which may be
+    "Scores after Time Deduction" rather than "Raw Scores".
+    :param path: sheet name, for errors
+    :return: list of groups and a (groups x judges) array of their raw scores
+    """
+    if not cells:
+        raise ScoreFormatError(path, 1, "empty sheet")
+    header = [str(cell) for cell in cells[0]]
+    converted = next((n for n, cell in enumerate(header) if cell.startswith("Converted Scores")), None)
+    if converted is None:
+        raise ScoreFormatError(path, 1, "no Converted Scores column")
+    raw_start = max((n for n, cell in enumerate(header[0:converted]) if "Scores" in cell), default=None)
+    if raw_start is None:
+        raise ScoreFormatError(path, 1, "no raw scores column")
+    num_judges = converted - raw_start
+
+    groups = []
+    scores = []
+    # Sheet rows are numbered from 1, and the groups start after the two header rows
+    for line, row in enumerate(cells[2:], 3):
+        if not row or not str(row[0]).strip():
+            continue
+        values = row[raw_start:converted]
+        if len(values) != num_judges:
+            raise ScoreFormatError(path, line, f"expected {num_judges} scores, found {len(values)}")
+        try:
+            scores.append([float(value) for value in values])
+        except ValueError:
+            raise ScoreFormatError(path, line, f"invalid score in {values!r}")
+        groups.append(str(row[0]).strip())
+
+    return groups, numpy.array(scores, dtype=float).reshape(len(groups), num_judges)
 
 
 class GSheetsScoreManager(ScoreManager):
     """
-    TODO: INCOMPLETE
+    Scores from each comp's Google Sheet, as listed in SCORES_DIR/year/sheet_ids.json. Sheets are fetched
+    in HTTP batches, and parsed scores are cached on disk under the sheet's Drive version, so a sheet is
+    only downloaded again after it's edited. `sheets` and `drive` services can be passed in instead of
+    credentials, e.g. the fakes in fake_sheets.
     """
 
-    def __init__(self):
-        self.creds = get_creds()
+    def __init__(self, creds=None, cache_dir: str = SHEETS_CACHE_DIR, sheets=None, drive=None,
+                 sheet_ids: Dict[str, Dict[str, str]] = None):
+        if sheets is None or drive is None:
+            creds = creds or get_creds()
+        # Services are built once; building one loads its discovery document
+        self.sheets = sheets or build('sheets', 'v4', credentials=creds, cache_discovery=False)
+        self.drive = drive or build('drive', 'v3', credentials=creds, cache_discovery=False)
+        self.cache_dir = cache_dir
+        # year -> comp -> sheet ID
+        self._sheet_ids: Dict[str, Dict[str, str]] = dict(sheet_ids or {})
+
+    def sheet_ids(self, year: str) -> Dict[str, str]:
+        if year not in self._sheet_ids:
+            with open(os.path.join(SCORES_DIR, year, "sheet_ids.json")) as infile:
+                self._sheet_ids[year] = json.load(infile)
+        return self._sheet_ids[year]
 
-    def get_raw_scores(self, year: str, name: str) -> ScoresDict:
-        with open(os.path.join(SCORES_DIR, year, "sheet_ids.json")) as infile:
-            sheet_ids = json.load(infile)
+    def _batch(self, service, requests: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Executes requests in HTTP batches of up to SHEETS_BATCH_SIZE.
+        :return: dictionary of request ID to response
+        """
+        responses = {}
 
-        sheet_id = sheet_ids[name]
+        def callback(request_id, response, exception):
+            if exception is not None:
+                raise exception
+            responses[request_id] = response
 
-        service = build('sheets', 'v4', credentials=self.creds)
+        ids = list(requests)
+        for start in range(0, len(ids), SHEETS_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id in ids[start:start + SHEETS_BATCH_SIZE]:
+                batch.add(requests[request_id], request_id=request_id)
+            batch.execute()
 
+        return responses
+
+    def revisions(self, year: str, names: List[str]) -> Dict[str, Hashable]:
+        """
+        :return: every comp's sheet ID and the sheet's Drive version, which increases with every edit, as
+        "<sheet ID>@<version>"
+        """
+        sheet_ids = self.sheet_ids(year)
         # pylint: disable=no-member
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=sheet_id,
-                                    range="Calculator").execute()
-        sheet_contents = result.get('values', [])
+        responses = self._batch(self.drive, {
+            name: self.drive.files().get(fileId=sheet_ids[name], fields="version") for name in names
+        })
+        return {name: f"{sheet_ids[name]}@{responses[name]['version']}" for name in names}
+
+    def revision(self, year: str, name: str) -> Hashable:
+        return self.revisions(year, [name])[name]
+
+    def _cache_path(self, revision: str) -> str:
+        return os.path.join(self.cache_dir, f"{revision}.json")
+
+    def get_many(self, year: str, names: List[str], revisions: Dict[str, Hashable] = None
+                 ) -> Dict[str, Tuple[List[Group], numpy.ndarray]]:
+        """
+        Reads unchanged sheets from the disk cache and downloads the rest in batches.
+        :param revisions: the sheets' revisions, looked up in one batch if not given
+        """
+        sheet_ids = self.sheet_ids(year)
+        revisions = revisions if revisions is not None else self.revisions(year, names)
 
-        team_count = len(sheet_contents) - 2
-        judge_count = sheet_contents[0].index(
-            "Converted Scores") - sheet_contents[0].index("Raw Scores")
+        matrices = {}
+        for name in names:
+            path = self._cache_path(revisions[name])
+            if os.path.exists(path):
+                with open(path) as infile:
+                    cached = json.load(infile)
+                matrices[name] = cached["groups"], numpy.array(cached["scores"], dtype=float).reshape(
+                    len(cached["groups"]), cached["judges"])
 
-        print("lel")
+        missing = [name for name in names if name not in matrices]
+        # pylint: disable=no-member
+        responses = self._batch(self.sheets, {
+            name: self.sheets.spreadsheets().values().get(
+                spreadsheetId=sheet_ids[name], range=SHEET_CALC, valueRenderOption="UNFORMATTED_VALUE")
+            for name in missing
+        })
+
+        pathlib.Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+        written = {}
+        for name in missing:
+            groups, scores = parse_calculator(responses[name].get('values', []), f"{name}:{SHEET_CALC}")
+            matrices[name] = groups, scores
+
+            sheet_id = sheet_ids[name]
+            path = self._cache_path(revisions[name])
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, 'w') as outfile:
+                json.dump({"groups": groups, "judges": scores.shape[1], "scores": scores.ravel().tolist()}, outfile)
+            os.replace(tmp, path)
+            written[sheet_id] = path
+
+        # Older versions of the downloaded sheets are never read again
+        if written:
+            for entry in os.scandir(self.cache_dir):
+                sheet_id = entry.name.split("@")[0]
+                if sheet_id in written and entry.path != written[sheet_id] and entry.name.endswith(".json"):
+                    os.remove(entry.path)
+
+        return {name: matrices[name] for name in names}
+
+    def get_score_matrix(self, year: str, name: str) -> Tuple[List[Group], numpy.ndarray]:
+        return self.get_many(year, [name])[name]
+
+    def get_raw_scores(self, year: str, name: str) -> Tuple[ScoresDict, int]:
+        groups, scores = self.get_score_matrix(year, name)
+        return dict(zip(groups, scores.tolist())), scores.shape[1]
@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import sys
+from typing import Any, Dict, List
+
+import numpy
+
+from circuit_view import CircuitView, STATS, get_comps
+from season import Season
+from view_cache import ViewCache
+
+# Bump when the layout of the manifest or chunks changes
+BUNDLE_VERSION = 1
+
+MANIFEST = "manifest.json"
+
+# Stats are rounded to this many decimals; the site shows two
+STAT_DECIMALS = 4
+
+
+def encode(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def prefix_chunk(view: CircuitView, season: Season, p: int) -> Dict[str, Any]:
+    """
+    :return: standings, stats and ranks after the first `p` + 1 comps. Stats and ranks are (groups x
+    stats) lists in the order of the manifest's groups, as in Season.
+    """
+    return {
+        "n": p + 1,
+        "comp": season.comps[p],
+        "total": int(season.totals[p]),
+        "standings": CircuitView.standings_json(view.standings.buckets()),
+        "stats": numpy.round(season.stats[p], STAT_DECIMALS).tolist(),
+        "ranks": season.ranks[p].tolist(),
+    }
+
+
+def progression_chunk(season: Season) -> Dict[str, Any]:
+    """
+    :return: every group's ranks after each comp, as a (groups x prefixes x stats) list
+    """
+    return {
+        "totals": season.totals.tolist(),
+        "ranks": season.ranks.transpose(1, 0, 2).tolist(),
+    }
+
+
+class BundleWriter:
+    """
+    Writes chunks into a bundle directory. Files are named after the hash of their contents, so a chunk
+    that didn't change since the last export keeps its file (and the browser's cached copy), and readers
+    of the old manifest never see a half-written chunk.
+    """
+
+    def __init__(self, directory: str, compress: bool):
+        self.directory = directory
+        self.compress = compress
+        self.chunks: Dict[str, Dict[str, Any]] = {}
+        self.written: List[str] = []
+
+    def add(self, name: str, data: Any):
+        content = encode(data)
+        digest = hashlib.sha256(content).hexdigest()
+        filename = f"{name}.{digest[0:16]}.json" + (".gz" if self.compress else "")
+        path = os.path.join(self.directory, filename)
+
+        if not os.path.exists(path):
+            if self.compress:
+                # mtime=0 so the same chunk always compresses to the same bytes
+                content = gzip.compress(content, mtime=0)
+            tmp = f"{path}.tmp{os.getpid()}"
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+            self.written.append(filename)
+
+        self.chunks[name] = {"file": filename, "sha256": digest, "bytes": os.path.getsize(path)}
+
+    def finish(self, manifest: Dict[str, Any]):
+        """
+        Writes the manifest, then removes the files of chunks it no longer references.
+        """
+        path = os.path.join(self.directory, MANIFEST)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump({**manifest, "chunks": self.chunks}, f, indent=2)
+        os.replace(tmp, path)
+
+        current = {chunk["file"] for chunk in self.chunks.values()}
+        for entry in os.scandir(self.directory):
+            if entry.name != MANIFEST and entry.name not in current and ".json" in entry.name:
+                os.remove(entry.path)
+
+
+def export_bundle(year: str, out_dir: str = "bundle", compress: bool = False,
+                  cache: ViewCache = None) -> List[str]:
+    """
+    Exports standings, stats and ranks after every prefix of the year's comps, and every group's rank
+    progression, to `out_dir`/`year`. The manifest lists the year's comps, groups and the file of every
+    chunk: "prefix_<n>" for the first n comps, and "progression".
+    :return: the files written, i.e. the chunks that changed since the last export
+    """
+    cache = cache or ViewCache()
+    comps = get_comps(-1, year)
+    views = cache.get_prefix_views(year, comps)
+    season = Season.from_views(views)
+
+    directory = os.path.join(out_dir, year)
+    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+    writer = BundleWriter(directory, compress)
+    for p, view in enumerate(views):
+        writer.add(f"prefix_{p + 1}", prefix_chunk(view, season, p))
+    writer.add("progression", progression_chunk(season))
+
+    writer.finish({
+        "version": BUNDLE_VERSION,
+        "year": year,
+        "comps": comps,
+        "groups": season.groups,
+        "stats": STATS,
+        "rank_method": views[-1].rank_method,
+        "compressed": compress,
+    })
+
+    return writer.written
+
+
+if __name__ == '__main__':
+    # python export_bundle.py year [out_dir] [--gzip]
+    args = [arg for arg in sys.argv[1:] if arg != "--gzip"]
+    written = export_bundle(args[0], args[1] if len(args) > 1 else "bundle", "--gzip" in sys.argv)
+    print(f"{len(written)} chunks written")
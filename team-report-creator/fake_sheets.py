@@ -0,0 +1,144 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy
+
+from circuit_view import get_comps
+from comp_score_mgr import LocalScoreManager, SHEET_CALC
+from util import Group
+
+
+def calculator_values(groups: List[Group], scores: numpy.ndarray) -> List[List[Any]]:
+    """
+    :return: the values of a Calculator sheet as laid out by spreadsheet_creator.calculator_sheet, as
+    returned by the Sheets API with UNFORMATTED_VALUE
+    """
+    num_judges = scores.shape[1]
+    converted = 100 * scores / scores.sum(axis=0) * len(groups) if len(groups) else scores
+    averages = converted.mean(axis=1)
+    places = (averages[None, :] > averages[:, None]).sum(axis=1) + 1
+
+    header_1 = ["Teams", "Raw Scores"] + [""] * (num_judges - 1) + ["Converted Scores"] + [""] * (
+        num_judges - 1) + ["Results"]
+    header_2 = [""] + [f"Judge {n + 1}" for n in range(num_judges)] * 2 + ["Average", "Sanity", "Place"]
+    rows = [
+        [group, *scores[i].tolist(), *converted[i].tolist(), float(averages[i]), float(scores[i].mean()),
+         int(places[i])]
+        for i, group in enumerate(groups)
+    ]
+    return [header_1, header_2] + rows
+
+
+class FakeSpreadsheets:
+    """
+    In-memory spreadsheets shared by a FakeSheetsService and a FakeDriveService. Every update bumps the
+    spreadsheet's Drive version, as an edit does.
+    """
+
+    def __init__(self):
+        # sheet ID -> (version, sheet name -> values)
+        self.files: Dict[str, Tuple[int, Dict[str, List[List[Any]]]]] = {}
+
+    def update(self, sheet_id: str, sheet: str, values: List[List[Any]]):
+        version, sheets = self.files.get(sheet_id, (0, {}))
+        self.files[sheet_id] = version + 1, {**sheets, sheet: values}
+
+
+class FakeRequest:
+    def __init__(self, service: 'FakeService', fn: Callable[[], Any]):
+        self.service = service
+        self.fn = fn
+
+    def execute(self) -> Any:
+        self.service.round_trip()
+        return self.fn()
+
+
+class FakeBatch:
+    """
+    Stand-in for googleapiclient's BatchHttpRequest: all requests added go in one round trip.
+    """
+
+    def __init__(self, service: 'FakeService', callback: Callable = None):
+        self.service = service
+        self.callback = callback
+        self.requests: List[Tuple[str, FakeRequest, Callable]] = []
+
+    def add(self, request: FakeRequest, callback: Callable = None, request_id: str = None):
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self):
+        self.service.round_trip()
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = request.fn(), None
+            except Exception as e:
+                response, exception = None, e
+            callback(request_id, response, exception)
+
+
+class FakeService:
+    """
+    Counts round trips to the (fake) server, each of which waits `latency` seconds.
+    """
+
+    def __init__(self, spreadsheets: FakeSpreadsheets, latency: float = 0.0):
+        self.data = spreadsheets
+        self.latency = latency
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        time.sleep(self.latency)
+
+    def new_batch_http_request(self, callback: Callable = None) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+
+class FakeSheetsService(FakeService):
+    """
+    The subset of the Sheets v4 service used by GSheetsScoreManager:
+    spreadsheets().values().get(spreadsheetId, range).
+    """
+
+    def spreadsheets(self) -> 'FakeSheetsService':
+        return self
+
+    def values(self) -> 'FakeSheetsService':
+        return self
+
+    def get(self, spreadsheetId: str, range: str, **kwargs) -> FakeRequest:
+        return FakeRequest(self, lambda: {"range": range, "values": self.data.files[spreadsheetId][1][range]})
+
+
+class FakeDriveService(FakeService):
+    """
+    The subset of the Drive v3 service used by GSheetsScoreManager: files().get(fileId, fields).
+    """
+
+    def files(self) -> 'FakeDriveService':
+        return self
+
+    def get(self, fileId: str, fields: str = None, **kwargs) -> FakeRequest:
+        return FakeRequest(self, lambda: {"id": fileId, "version": str(self.data.files[fileId][0])})
+
+
+def from_local(year: str, latency: float = 0.0
+               ) -> Tuple[FakeSpreadsheets, FakeSheetsService, FakeDriveService, Dict[str, str]]:
+    """
+    Builds fake spreadsheets holding the local score files of `year`.
+    :return: the spreadsheets, Sheets and Drive services, and comp -> sheet ID
+    """
+    spreadsheets = FakeSpreadsheets()
+    score_mgr = LocalScoreManager()
+    sheet_ids = {}
+    for comp in get_comps(-1, year):
+        sheet_ids[comp] = f"sheet-{year}-{comp}"
+        spreadsheets.update(sheet_ids[comp], SHEET_CALC,
+                            calculator_values(*score_mgr.get_score_matrix(year, comp)))
+
+    return (spreadsheets, FakeSheetsService(spreadsheets, latency), FakeDriveService(spreadsheets, latency),
+            sheet_ids)
@@ -0,0 +1,69 @@
+import concurrent.futures
+import os
+import sys
+from typing import Dict, List, Tuple
+
+import view_format
+from circuit_view import CircuitView, get_comps
+from util import SCORES_DIR
+from view_cache import ViewCache
+
+
+def available_years() -> List[str]:
+    """
+    :return: every year under SCORES_DIR that has a details.json, in order
+    """
+    return sorted(year for year in os.listdir(SCORES_DIR)
+                  if os.path.exists(os.path.join(SCORES_DIR, year, "details.json")))
+
+
+def process_year(year: str, cache_dir: str) -> Tuple[str, str]:
+    """
+    Processes a full year into the cache. Runs in a worker process; only the full view is built and
+    cached, and eviction is left to the parent so workers don't remove each other's files.
+    :return: the year and the path of its cached view, so only a path is sent back to the parent
+    """
+    cache = ViewCache(cache_dir)
+    comps = get_comps(-1, year)
+    view = CircuitView(score_mgr=cache.score_mgr)
+    view.process(-1, year)
+    cache.put(year, comps, view, evict=False)
+
+    return year, cache.path(cache.key(year, comps))
+
+
+def process_years(years: List[str] = None, processes: int = None, cache_dir: str = "cache"
+                  ) -> Dict[str, CircuitView]:
+    """
+    Processes full-year views for `years` (or every available year), spreading the years that aren't
+    cached yet over a pool of `processes` worker processes (default: one per core).
+    :return: dictionary of year to view, with views loaded (memory-mapped) from the cache
+    """
+    years = years if years is not None else available_years()
+    cache = ViewCache(cache_dir)
+
+    views: Dict[str, CircuitView] = {}
+    missing = []
+    for year in years:
+        view = cache.get(year, get_comps(-1, year))
+        if view is None:
+            missing.append(year)
+        else:
+            views[year] = view
+
+    if missing:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(process_year, year, cache_dir) for year in missing]
+            for future in concurrent.futures.as_completed(futures):
+                year, path = future.result()
+                views[year] = view_format.load_view(path)
+                print(year, "processed")
+        cache.evict()
+
+    return {year: views[year] for year in years}
+
+
+if __name__ == '__main__':
+    all_views = process_years(sys.argv[1:] or None)
+    for year, view in all_views.items():
+        print(f"{year}: {len(view.comps)} comps, {len(view.groups)} groups")
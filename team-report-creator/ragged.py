@@ -0,0 +1,73 @@
+from typing import List, Tuple
+
+import numpy
+
+
+class RaggedScores:
+    """
+    Scores of many groups in one flat array: group i's scores are values[offsets[i]:offsets[i + 1]],
+    in the order they were added.
+    """
+
+    def __init__(self, values: numpy.ndarray, offsets: numpy.ndarray):
+        self.values = values
+        self.offsets = offsets
+
+    @staticmethod
+    def build(num_groups: int, parts: List[Tuple[List[int], numpy.ndarray]]) -> 'RaggedScores':
+        """
+        Builds the flat array from per-comp parts.
+        :param num_groups: number of groups (rows)
+        :param parts: (group rows, (groups x judges) scores array) for each comp, in order
+        """
+        if not parts:
+            return RaggedScores(numpy.zeros(0), numpy.zeros(num_groups + 1, dtype=int))
+
+        ids = numpy.concatenate([numpy.repeat(numpy.asarray(rows, dtype=int), scores.shape[1])
+                                 for rows, scores in parts])
+        values = numpy.concatenate([scores.ravel() for _, scores in parts])
+
+        # Stable, so each group's scores stay in comp order
+        order = numpy.argsort(ids, kind="stable")
+        counts = numpy.bincount(ids, minlength=num_groups)
+        offsets = numpy.concatenate([[0], numpy.cumsum(counts)])
+
+        return RaggedScores(values[order], offsets)
+
+    def counts(self) -> numpy.ndarray:
+        return numpy.diff(self.offsets)
+
+    def group(self, row: int) -> numpy.ndarray:
+        return self.values[self.offsets[row]:self.offsets[row + 1]]
+
+    def _ids(self) -> numpy.ndarray:
+        return numpy.repeat(numpy.arange(len(self.offsets) - 1), self.counts())
+
+    def means(self) -> numpy.ndarray:
+        """
+        :return: mean per group (nan for groups without scores)
+        """
+        counts = self.counts()
+        sums = numpy.bincount(self._ids(), weights=self.values, minlength=len(counts))
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts
+
+    def medians(self) -> numpy.ndarray:
+        """
+        :return: median per group (nan for groups without scores)
+        """
+        counts = self.counts()
+        ids = self._ids()
+        # Sort values within each group's segment
+        ordered = self.values[numpy.lexsort((self.values, ids))]
+
+        starts = self.offsets[:-1]
+        empty = counts == 0
+        lo = numpy.where(empty, 0, starts + (counts - 1) // 2)
+        hi = numpy.where(empty, 0, starts + counts // 2)
+        if not len(ordered):
+            return numpy.full(len(counts), numpy.nan)
+
+        medians = (ordered[lo] + ordered[hi]) / 2
+        medians[empty] = numpy.nan
+        return medians
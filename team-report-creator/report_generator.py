@@ -13,7 +13,11 @@ import numpy
 from jinja2 import Template
 from tabulate import tabulate
 
-from circuit_view import CircuitView, RAW, NORMAL
+from circuit_view import CircuitView, RAW, NORMAL, get_comps
+from comp_score_mgr import CachingScoreManager, LocalScoreManager
+from season import Season
+from tracing import span, traced
+from view_cache import ViewCache
 
 JUDGES_PER_ROW = 4
 
@@ -52,6 +56,11 @@ def t_print_table(s: str, n=1):
 
 class Runner:
     def __init__(self):
+        self.year = "2018-19"
+        # One score cache for the run, so every view reads each comp once
+        self.score_mgr = CachingScoreManager(LocalScoreManager())
+        self.cache = ViewCache(score_mgr=self.score_mgr)
+
         # TODO remove and replace with details.json
         # Competitions for 2018-19
         self.comps_18_19: List[str] = ['jeena', 'anahat',
@@ -67,14 +76,21 @@ class Runner:
         :param n: n is number of competitions to consider
         :return:
         """
-        if os.path.exists(f"cache/{n}.json"):
-            view = CircuitView.load(f"cache/{n}.json")
-        else:
-            view = CircuitView(self.comps_18_19[0:n])
-            pathlib.Path("cache/").mkdir(parents=True, exist_ok=True)
-            view.dump(f"cache/{n}.json")
+        return self.cache.get_view(self.year, get_comps(n, self.year))
 
-        return view
+    @traced()
+    def get_circuit_views(self) -> List[CircuitView]:
+        """
+        :return: one view per prefix of the year's competitions, i.e. after 1, 2, ... competitions
+        """
+        return self.cache.get_prefix_views(self.year, get_comps(len(self.comps_18_19), self.year))
+
+    @traced()
+    def get_season(self) -> Season:
+        """
+        :return: every group's stats and ranks after each of the year's competitions
+        """
+        return self.cache.get_season(self.year, get_comps(len(self.comps_18_19), self.year))
 
     def print_text_report(self, circuit_views: List[CircuitView], group: str):
         full = circuit_views[-1]
@@ -128,8 +144,7 @@ class Runner:
 
         # SECTION 3: Progression through the year
         print("3. Rank Progression:\n")
-        rank_progression = [circuit_views[i].get_group_ranks(
-            group) for i in range(len(self.comps_18_19))]
+        rank_progression = self.get_season().group_rank_progression(group)
         print(tabulate([
             ('Abs Median', *(stat['amed'] for stat in rank_progression)),
             ('Abs Mean', *(stat['amean'] for stat in rank_progression)),
@@ -148,13 +163,16 @@ class Runner:
         print("Average groups per competition:", r(full.avg_groups_per_comp))
         print("Average judges per competition:", r(full.avg_judges_per_comp))
         print("Average competitions per group:", r(full.avg_comps_per_group))
-        print(f"Best single-judge raw score: ", end="")
-        print(f"{full.best_score['score']},",
-              full.best_score['group'], "at", full.best_score['comp'])
+        if full.best_score:
+            print(f"Best single-judge raw score: ", end="")
+            print(f"{full.best_score['score']},",
+                  full.best_score['group'], "at", self.comp_names_18_19[full.best_score['comp']],
+                  f"(Judge {full.best_score['judge'] + 1})")
 
         print()
         print_sep()
 
+    @traced()
     def render_html(self, circuit_views: List[CircuitView], group: str):
         # Compile numbers
         full = circuit_views[-1]
@@ -188,12 +206,13 @@ class Runner:
 
             comp_details[comp] = comp_details_processed
 
-        with open(os.path.join(TEMPLATES_DIR, "reportbase.html")) as f:
-            t = Template(f.read())
+        with span("compile_template"):
+            with open(os.path.join(TEMPLATES_DIR, "reportbase.html")) as f:
+                t = Template(f.read())
 
         pathlib.Path(os.path.join(OUTPUT_DIR, group)).mkdir(
             parents=True, exist_ok=True)
-        with open(os.path.join(OUTPUT_DIR, group, "report.html"), 'w') as f:
+        with open(os.path.join(OUTPUT_DIR, group, "report.html"), 'w') as f, span("render_template", group=group):
             f.write(
                 t.render(
                     group=group,
@@ -212,6 +231,7 @@ class Runner:
         print(group, "HTML rendered")
 
     @staticmethod
+    @traced()
     def render_pdf(group: str):
         pathlib.Path(os.path.join(OUTPUT_DIR, group)).mkdir(
             parents=True, exist_ok=True)
@@ -219,20 +239,23 @@ class Runner:
         pdf_arg = f"--print-to-pdf={path}"
         html = f"http://localhost:8000/{group}/report.html"
         for n in range(5):
-            ret = subprocess.run([
-                EXE, *BASE_ARGS, pdf_arg, html
-            ])
+            with span("chromium", group=group, attempt=n) as trace_args:
+                ret = subprocess.run([
+                    EXE, *BASE_ARGS, pdf_arg, html
+                ])
+                trace_args["returncode"] = ret.returncode
             if ret.returncode is 0:
                 break
             print(group, f"PDF rendering failed, trying again (n={n})")
-            time.sleep(1)
+            with span("retry_wait", group=group, attempt=n):
+                time.sleep(1)
 
         print(group, "PDF rendered")
 
+    @traced()
     def run(self, single_group: str = None, all_groups=False):
         # Setup
-        circuit_views = [self.get_circuit_view(
-            i) for i in range(1, len(self.comps_18_19) + 1)]
+        circuit_views = self.get_circuit_views()
         full = circuit_views[-1]
 
         if not all_groups:
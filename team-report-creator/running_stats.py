@@ -0,0 +1,50 @@
+import heapq
+from typing import Iterable, List
+
+from util import Score, Stat
+
+
+class RunningStats:
+    """
+    Median and mean of a stream of scores. Adding a score is O(log n); the median and mean are O(1).
+
+    The median is kept between two heaps: a max-heap of the lower half of the scores and a min-heap of
+    the upper half, with the lower half holding the extra score when the count is odd.
+    """
+
+    def __init__(self, scores: Iterable[Score] = ()):
+        # Scores are negated, as heapq only provides min-heaps
+        self.low: List[Score] = []
+        self.high: List[Score] = []
+        self.count = 0
+        self.total = 0.0
+        self.extend(scores)
+
+    def add(self, score: Score):
+        if not self.low or score <= -self.low[0]:
+            heapq.heappush(self.low, -score)
+        else:
+            heapq.heappush(self.high, score)
+
+        # Rebalance so that len(low) is len(high) or len(high) + 1
+        if len(self.low) > len(self.high) + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+        elif len(self.high) > len(self.low):
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+
+        self.count += 1
+        self.total += score
+
+    def extend(self, scores: Iterable[Score]):
+        for score in scores:
+            self.add(score)
+
+    def median(self) -> Stat:
+        if not self.count:
+            return float("nan")
+        if len(self.low) > len(self.high):
+            return -self.low[0]
+        return (-self.low[0] + self.high[0]) / 2
+
+    def mean(self) -> Stat:
+        return self.total / self.count if self.count else float("nan")
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import pathlib
+import struct
+import sys
+import threading
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy
+
+from circuit_view import get_comps
+from comp_score_mgr import LocalScoreManager, ScoreManager
+from util import Group, ScoresDict
+
+# File layout:
+#   MAGIC | version (u32) | header length (u32) | JSON header | padding | array blocks
+# The header holds the year's comps in order, the interned group and judge name tables, and the dtype,
+# shape and offset (relative to the start of the first block) of every block:
+#   scores     float64, every comp's (groups x judges) scores back to back
+#   group_ids  int32, the group (index into the group table) of every score row
+#   judge_ids  int32, the judge (index into the judge table) of every score column of every comp
+#   index      int64 (comps x 5), per comp: offset in scores, first row, rows, first judge, judges
+MAGIC = b"SCARCH\0\0"
+FORMAT_VERSION = 1
+EXT = ".scarch"
+ALIGN = 64
+
+ARCHIVE_DIR = "archives"
+
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def archive_path(year: str, directory: str = ARCHIVE_DIR) -> str:
+    return os.path.join(directory, f"{year}{EXT}")
+
+
+def pack_season(year: str, filename: str = None, score_mgr: ScoreManager = None) -> str:
+    """
+    Packs every comp of `year` (in the order of its details.json) into one archive file.
+    :param score_mgr: source of the scores, local score files by default
+    :return: the archive's file name
+    """
+    filename = filename or archive_path(year)
+    score_mgr = score_mgr or LocalScoreManager()
+    comps = get_comps(-1, year)
+    matrices = score_mgr.get_many(year, comps)
+
+    groups: Dict[Group, int] = {}
+    judges: Dict[str, int] = {}
+    index = numpy.zeros((len(comps), 5), dtype=numpy.int64)
+    group_ids: List[int] = []
+    judge_ids: List[int] = []
+    offset = 0
+    for i, comp in enumerate(comps):
+        comp_groups, scores = matrices[comp]
+        # Score files don't name their judges
+        labels = [f"Judge {n + 1}" for n in range(scores.shape[1])]
+        index[i] = offset, len(group_ids), len(comp_groups), len(judge_ids), len(labels)
+        group_ids.extend(groups.setdefault(group, len(groups)) for group in comp_groups)
+        judge_ids.extend(judges.setdefault(label, len(judges)) for label in labels)
+        offset += scores.size
+
+    arrays = {
+        "scores": numpy.concatenate([matrices[comp][1].ravel() for comp in comps]) if comps
+        else numpy.zeros(0),
+        "group_ids": numpy.array(group_ids, dtype=numpy.int32),
+        "judge_ids": numpy.array(judge_ids, dtype=numpy.int32),
+        "index": index,
+    }
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({
+        "year": year,
+        "comps": comps,
+        "groups": list(groups),
+        "judges": list(judges),
+        "arrays": layout,
+    }).encode()
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    pathlib.Path(os.path.dirname(filename) or ".").mkdir(parents=True, exist_ok=True)
+    # Readers may have the old archive mapped; write a new file and swap it in
+    tmp = f"{filename}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(numpy.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, filename)
+
+    return filename
+
+
+class ScoreArchive:
+    """
+    A season archive, memory-mapped once. Scores are returned as read-only slices of the mapping.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise Exception(f"{filename} is not a score archive")
+            if version != FORMAT_VERSION:
+                raise Exception(f"{filename} has unsupported format version {version}")
+            header = json.loads(f.read(header_len))
+        data_start = _align(_PREAMBLE.size + header_len)
+
+        st = os.stat(filename)
+        self.stamp = (st.st_mtime_ns, st.st_size)
+        self.year: str = header["year"]
+        self.comps: List[str] = header["comps"]
+        self.groups: List[Group] = header["groups"]
+        self.judges: List[str] = header["judges"]
+        self._comp_index = {comp: i for i, comp in enumerate(self.comps)}
+        # comp -> digest of its groups and scores
+        self._digests: Dict[str, str] = {}
+
+        mapping = numpy.memmap(filename, dtype=numpy.uint8, mode='r') if st.st_size > data_start else None
+        self.arrays: Dict[str, numpy.ndarray] = {}
+        for name, spec in header["arrays"].items():
+            dtype = numpy.dtype(spec["dtype"])
+            shape = tuple(spec["shape"])
+            if int(numpy.prod(shape)) == 0:
+                self.arrays[name] = numpy.zeros(shape, dtype=dtype)
+            else:
+                self.arrays[name] = numpy.ndarray(shape, dtype=dtype, buffer=mapping,
+                                                  offset=data_start + spec["offset"])
+
+    def _entry(self, comp: str) -> Tuple[int, int, int, int, int]:
+        if comp not in self._comp_index:
+            raise Exception("Illegal argument: comp")
+        return tuple(int(n) for n in self.arrays["index"][self._comp_index[comp]])
+
+    def score_matrix(self, comp: str) -> Tuple[List[Group], numpy.ndarray]:
+        """
+        :return: list of groups and a read-only (groups x judges) view of their scores in the archive
+        """
+        offset, first_row, rows, _, num_judges = self._entry(comp)
+        scores = self.arrays["scores"][offset:offset + rows * num_judges].reshape(rows, num_judges)
+        group_ids = self.arrays["group_ids"][first_row:first_row + rows]
+        return [self.groups[g] for g in group_ids.tolist()], scores
+
+    def digest(self, comp: str) -> str:
+        """
+        :return: SHA-256 of the comp's groups and scores, so repacking a season keeps the digests of the
+        comps that didn't change
+        """
+        if comp not in self._digests:
+            groups, scores = self.score_matrix(comp)
+            h = hashlib.sha256(json.dumps([groups, list(scores.shape)]).encode())
+            h.update(numpy.ascontiguousarray(scores).tobytes())
+            self._digests[comp] = h.hexdigest()
+        return self._digests[comp]
+
+    def comp_judges(self, comp: str) -> List[str]:
+        _, _, _, first_judge, num_judges = self._entry(comp)
+        return [self.judges[j] for j in self.arrays["judge_ids"][first_judge:first_judge + num_judges].tolist()]
+
+
+class PackedScoreManager(ScoreManager):
+    """
+    Scores from packed season archives (see pack_season), one per year in `directory`. Each archive is
+    opened and memory-mapped on first use; a repacked archive is mapped again.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._archives: Dict[str, ScoreArchive] = {}
+        self._lock = threading.Lock()
+
+    def archive(self, year: str) -> ScoreArchive:
+        path = archive_path(year, self.directory)
+        st = os.stat(path)
+        with self._lock:
+            archive = self._archives.get(year)
+            if archive is None or archive.stamp != (st.st_mtime_ns, st.st_size):
+                archive = self._archives[year] = ScoreArchive(path)
+            return archive
+
+    def get_score_matrix(self, year: str, name: str) -> Tuple[List[Group], numpy.ndarray]:
+        return self.archive(year).score_matrix(name)
+
+    def get_raw_scores(self, year: str, name: str) -> Tuple[ScoresDict, int]:
+        groups, scores = self.get_score_matrix(year, name)
+        return dict(zip(groups, scores.tolist())), scores.shape[1]
+
+    def get_many(self, year: str, names: List[str], revisions: Dict[str, Hashable] = None
+                 ) -> Dict[str, Tuple[List[Group], numpy.ndarray]]:
+        # Slicing the mapping is cheap, there's nothing to fetch concurrently
+        archive = self.archive(year)
+        return {name: archive.score_matrix(name) for name in names}
+
+    def revision(self, year: str, name: str) -> Hashable:
+        return self.archive(year).digest(name)
+
+
+if __name__ == '__main__':
+    # python score_archive.py year [year ...]
+    for packed_year in sys.argv[1:]:
+        print(packed_year, "->", pack_season(packed_year))
@@ -0,0 +1,93 @@
+import json
+from typing import Any, Dict, List
+
+import numpy
+
+from circuit_view import CircuitView, STATS
+from util import Group
+
+
+class Season:
+    """
+    Stats and ranks of every group after each prefix of a year's comps, as dense (prefixes x groups x
+    stats) arrays (stats in STATS order). Groups that haven't competed yet after a prefix have stats of
+    0 and ranks of one past the number of groups at that point, as in CircuitView.get_group_ranks.
+    """
+
+    def __init__(self, year: str, comps: List[str], groups: List[Group], stats: numpy.ndarray,
+                 ranks: numpy.ndarray, totals: numpy.ndarray):
+        self.year = year
+        self.comps = comps
+        self.groups = groups
+        self.stats = stats
+        self.ranks = ranks
+        # Number of groups after each prefix
+        self.totals = totals
+        self._index = {group: i for i, group in enumerate(groups)}
+
+    @staticmethod
+    def from_views(views: List[CircuitView]) -> 'Season':
+        """
+        :param views: views after each prefix, i.e. after 1, 2, ... comps
+        """
+        full = views[-1]
+        groups = list(full.groups)
+        index = {group: i for i, group in enumerate(groups)}
+
+        stats = numpy.zeros((len(views), len(groups), len(STATS)))
+        ranks = numpy.zeros((len(views), len(groups), len(STATS)), dtype=int)
+        totals = numpy.array([len(view.groups) for view in views], dtype=int)
+        for p, view in enumerate(views):
+            ranks[p] = totals[p] + 1
+            rows = [index[group] for group in view.groups]
+            stats[p, rows] = view._stats.T
+            ranks[p, rows] = view._ranks.T
+
+        return Season(full.year, list(full.comps), groups, stats, ranks, totals)
+
+    def group_stats(self, group: Group) -> numpy.ndarray:
+        """
+        :return: (prefixes x stats) array of the group's stats
+        """
+        return self.stats[:, self._index[group]]
+
+    def group_ranks(self, group: Group) -> numpy.ndarray:
+        """
+        :return: (prefixes x stats) array of the group's ranks
+        """
+        return self.ranks[:, self._index[group]]
+
+    def group_rank_progression(self, group: Group) -> List[Dict[str, int]]:
+        """
+        :return: the group's ranks after each prefix, in the format of CircuitView.get_group_ranks
+        """
+        return [{**dict(zip(STATS, ranks.tolist())), "total": int(total)}
+                for ranks, total in zip(self.group_ranks(group), self.totals)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: every group's progression, as plain lists indexed [prefix][group][stat]
+        """
+        return {
+            "year": self.year,
+            "comps": self.comps,
+            "groups": self.groups,
+            "stats": STATS,
+            "totals": self.totals.tolist(),
+            "stat_values": self.stats.tolist(),
+            "ranks": self.ranks.tolist(),
+        }
+
+    def save(self, filename: str):
+        with open(filename, 'wb') as f:
+            numpy.savez(f, stats=self.stats, ranks=self.ranks, totals=self.totals,
+                        meta=numpy.array(json.dumps({
+                            "year": self.year, "comps": self.comps, "groups": self.groups
+                        })))
+
+    @staticmethod
+    def load(filename: str) -> 'Season':
+        with numpy.load(filename) as data:
+            meta = json.loads(str(data["meta"]))
+            return Season(meta["year"], meta["comps"], meta["groups"], data["stats"], data["ranks"],
+                          data["totals"])
@@ -0,0 +1,185 @@
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from cachetools import LRUCache
+from flask import Flask, abort, jsonify, request
+from flask_cors import CORS
+
+from circuit_view import CircuitView, get_comps
+from comp_score_mgr import CachingScoreManager, LocalScoreManager, ScoreManager
+from season import Season
+from util import SCORES_DIR
+from view_cache import ViewCache
+
+# Number of views, seasons and responses kept in memory
+MEMORY_CACHE_SIZE = 256
+
+# Score files are checked for changes at most this often (seconds)
+CHECK_INTERVAL = 2.0
+
+
+class StandingsService:
+    """
+    Serves standings, stats and progressions of processed views. Views and seasons come from the disk
+    ViewCache, and are kept (along with the responses built from them) in an in-memory LRU cache, keyed by
+    a fingerprint of the year's details.json and the revisions of its comps' scores. Changed scores (in
+    whichever backend `score_mgr` reads) or a changed details.json change the fingerprint, so stale
+    entries are never served; they are evicted as they fall out of use.
+    """
+
+    def __init__(self, cache_dir: str = "cache", size: int = MEMORY_CACHE_SIZE,
+                 check_interval: float = CHECK_INTERVAL, score_mgr: ScoreManager = None):
+        # e.g. a score_archive.PackedScoreManager, to map each season once instead of parsing its files
+        self.score_mgr = CachingScoreManager(score_mgr or LocalScoreManager())
+        self.view_cache = ViewCache(cache_dir, score_mgr=self.score_mgr)
+        self.memory = LRUCache(maxsize=size)
+        self.check_interval = check_interval
+        # year -> (time checked, comps, fingerprint)
+        self._fingerprints: Dict[str, Tuple[float, List[str], Tuple]] = {}
+        # Guards `memory` (cachetools caches aren't thread safe) and `_building`, only for lookups
+        self._lock = threading.Lock()
+        # key -> lock held while building it, so each entry is built at most once and other keys don't wait
+        self._building: Dict[Tuple, threading.Lock] = {}
+
+    def fingerprint(self, year: str) -> Tuple[List[str], Tuple]:
+        """
+        :return: the year's comps and a fingerprint of details.json (its modification time and size) and
+        the comps' score revisions
+        """
+        checked = self._fingerprints.get(year)
+        now = time.monotonic()
+        if checked is not None and now - checked[0] < self.check_interval:
+            return checked[1], checked[2]
+
+        details = os.path.join(SCORES_DIR, year, "details.json")
+        if not os.path.exists(details):
+            abort(404, f"Unknown year: {year}")
+        comps = get_comps(-1, year)
+        st = os.stat(details)
+        revisions = self.score_mgr.revisions(year, comps)
+
+        fingerprint = (st.st_mtime_ns, st.st_size, tuple(revisions[comp] for comp in comps))
+        self._fingerprints[year] = (now, comps, fingerprint)
+        return comps, fingerprint
+
+    def _memoized(self, key: Tuple, build):
+        with self._lock:
+            if key in self.memory:
+                return self.memory[key]
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # Built by another request while this one waited
+            with self._lock:
+                if key in self.memory:
+                    return self.memory[key]
+            value = build()
+            with self._lock:
+                self.memory[key] = value
+                self._building.pop(key, None)
+            return value
+
+    def _prefix(self, year: str, n: int = None) -> Tuple[List[str], Tuple]:
+        comps, fingerprint = self.fingerprint(year)
+        if n is None:
+            n = len(comps)
+        if not 1 <= n <= len(comps):
+            abort(400, f"n must be between 1 and {len(comps)}")
+        return comps[0:n], fingerprint
+
+    def view(self, year: str, n: int = None) -> CircuitView:
+        """
+        :return: the view after the first `n` comps of the year (all by default)
+        """
+        comps, fingerprint = self._prefix(year, n)
+        return self._memoized(("view", year, len(comps), fingerprint),
+                              lambda: self.view_cache.get_view(year, comps))
+
+    def season(self, year: str) -> Season:
+        comps, fingerprint = self._prefix(year)
+        return self._memoized(("season", year, fingerprint), lambda: self.view_cache.get_season(year, comps))
+
+    def _response(self, kind: str, year: str, n: int, group: str, build) -> Any:
+        comps, fingerprint = self._prefix(year, n)
+        return self._memoized((kind, year, len(comps), group, fingerprint), build)
+
+    def _check_group(self, year: str, group: str):
+        # The full view has every group of the year; the season would build every prefix
+        if group not in self.view(year).attended:
+            abort(404, f"Unknown group: {group}")
+
+    def standings(self, year: str, n: int = None) -> List[Dict[str, Any]]:
+        """
+        :return: the standings in the format of CircuitView.save_standings_json
+        """
+        return self._response("standings", year, n, None,
+                              lambda: CircuitView.standings_json(self.view(year, n).standings.buckets()))
+
+    def groups(self, year: str, n: int = None) -> List[str]:
+        return self._response("groups", year, n, None, lambda: sorted(self.view(year, n).groups))
+
+    def group_stats(self, year: str, group: str, n: int = None) -> Dict[str, float]:
+        self._check_group(year, group)
+        return self._response("stats", year, n, group, lambda: self.view(year, n).get_group_stats(group))
+
+    def group_ranks(self, year: str, group: str, n: int = None) -> Dict[str, int]:
+        self._check_group(year, group)
+        return self._response("ranks", year, n, group, lambda: self.view(year, n).get_group_ranks(group))
+
+    def group_progression(self, year: str, group: str) -> List[Dict[str, Any]]:
+        """
+        :return: the group's ranks after each comp, labelled with the comp
+        """
+        self._check_group(year, group)
+
+        def build():
+            season = self.season(year)
+            return [{"comp": comp, **ranks} for comp, ranks in
+                    zip(season.comps, season.group_rank_progression(group))]
+
+        return self._response("progression", year, None, group, build)
+
+
+app = Flask(__name__)
+CORS(app)
+service = StandingsService()
+
+
+def prefix_arg() -> int:
+    """
+    :return: the `n` query parameter, the number of comps to consider, or None for all
+    """
+    return request.args.get("n", default=None, type=int)
+
+
+@app.route("/<year>/standings")
+def standings(year: str):
+    return jsonify(service.standings(year, prefix_arg()))
+
+
+@app.route("/<year>/groups")
+def groups(year: str):
+    return jsonify(service.groups(year, prefix_arg()))
+
+
+@app.route("/<year>/groups/<group>/stats")
+def group_stats(year: str, group: str):
+    return jsonify(service.group_stats(year, group, prefix_arg()))
+
+
+@app.route("/<year>/groups/<group>/ranks")
+def group_ranks(year: str, group: str):
+    return jsonify(service.group_ranks(year, group, prefix_arg()))
+
+
+@app.route("/<year>/groups/<group>/progression")
+def group_progression(year: str, group: str):
+    return jsonify(service.group_progression(year, group))
+
+
+if __name__ == '__main__':
+    # python server.py [port]; `gunicorn server:app` works too
+    app.run(host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 5000, threaded=True)
@@ -0,0 +1,189 @@
+import concurrent.futures
+import sys
+from typing import Dict, List, Tuple
+
+import numpy
+from tabulate import tabulate
+
+from circuit_view import CircuitView, STATS, RAW, RANK_METHOD, get_comps, get_rank_array, score_matrix
+from util import Group
+from view_cache import ViewCache
+
+DEFAULT_SAMPLES = 1000
+DEFAULT_CHUNK = 100
+
+
+class Resampler:
+    """
+    The scores of a view laid out for resampling. Every group's scores across all of its comps go in one
+    row of `slots` (one slot per judge per attended comp), so a whole sample is a (groups x slots) array
+    that can be reduced to the four stats at once.
+    """
+
+    def __init__(self, view: CircuitView):
+        self.num_groups = len(view.groups)
+        # Per comp: group rows, raw (groups x judges) scores and the slot of every score
+        self.comps: List[Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]] = []
+
+        counts = numpy.zeros(self.num_groups, dtype=int)
+        for comp in view.comps:
+            details = view.comp_details[comp]
+            groups, scores = score_matrix(details[RAW], len(details["judge_avgs"]))
+            rows = numpy.array([view._index[group] for group in groups], dtype=int)
+            slots = counts[rows][:, None] + numpy.arange(scores.shape[1])
+            counts[rows] += scores.shape[1]
+            self.comps.append((rows, scores, slots))
+
+        # Number of scores per group, which resampling judges doesn't change
+        self.counts = counts
+        self.num_slots = int(counts.max()) if self.num_groups else 0
+
+    def sample_stats(self, rng: numpy.random.Generator, samples: int) -> numpy.ndarray:
+        """
+        Resamples the judges of every comp (with replacement) and computes the stats of every sample.
+        :return: (samples x stats x groups) array, stats in STATS order
+        """
+        raw = numpy.full((samples, self.num_groups, self.num_slots), numpy.nan)
+        normal = numpy.full((samples, self.num_groups, self.num_slots), numpy.nan)
+
+        for rows, scores, slots in self.comps:
+            num_judges = scores.shape[1]
+            judges = rng.integers(0, num_judges, size=(samples, num_judges))
+            # (samples x groups x judges)
+            resampled = scores[:, judges].transpose(1, 0, 2)
+            judge_avgs = resampled.mean(axis=1)
+            raw[:, rows[:, None], slots] = resampled
+            normal[:, rows[:, None], slots] = resampled * 100 / judge_avgs[:, None, :]
+
+        return numpy.stack([stat for scores in (raw, normal) for stat in self._med_mean(scores)], axis=1)
+
+    def _med_mean(self, scores: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        # Unused slots are nan, which sorts last, so each group's median is at a fixed position
+        ordered = numpy.sort(scores, axis=-1)
+        shape = (len(scores), self.num_groups, 1)
+        lo = numpy.broadcast_to(((self.counts - 1) // 2)[None, :, None], shape)
+        hi = numpy.broadcast_to((self.counts // 2)[None, :, None], shape)
+        med = (numpy.take_along_axis(ordered, lo, axis=-1)
+               + numpy.take_along_axis(ordered, hi, axis=-1))[..., 0] / 2
+        mean = numpy.nansum(scores, axis=-1) / self.counts
+
+        return med, mean
+
+
+def simulate_chunk(resampler: Resampler, seed: numpy.random.SeedSequence, samples: int,
+                   rank_method: str) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Runs `samples` resamples.
+    :return: histograms of each group's rank per stat (stats x groups x ranks) and of each group's
+    bucket, i.e. worst rank over the four stats (groups x ranks). Rank r is counted at index r.
+    """
+    ranks = get_rank_array(resampler.sample_stats(numpy.random.default_rng(seed), samples), rank_method)
+    num_ranks = resampler.num_groups + 1
+
+    # Histogram by adding offsets so every (stat, group) pair gets its own range of bins
+    pairs = numpy.arange(len(STATS) * resampler.num_groups).reshape(len(STATS), -1)
+    rank_hist = numpy.bincount((pairs * num_ranks + ranks).ravel(),
+                               minlength=pairs.size * num_ranks).reshape(len(STATS), -1, num_ranks)
+    buckets = ranks.max(axis=1)
+    bucket_hist = numpy.bincount((pairs[0] * num_ranks + buckets).ravel(),
+                                 minlength=resampler.num_groups * num_ranks).reshape(-1, num_ranks)
+
+    return rank_hist, bucket_hist
+
+
+class BootstrapResult:
+    """
+    Distribution of every group's ranks over the bootstrap samples.
+    """
+
+    def __init__(self, groups: List[Group], samples: int, rank_hist: numpy.ndarray,
+                 bucket_hist: numpy.ndarray):
+        self.groups = groups
+        self.samples = samples
+        self.rank_hist = rank_hist
+        self.bucket_hist = bucket_hist
+        self._index = {group: i for i, group in enumerate(groups)}
+
+    def _quantile(self, hist: numpy.ndarray, q: float) -> int:
+        return int(numpy.searchsorted(numpy.cumsum(hist), q * self.samples))
+
+    def rank_interval(self, group: Group, level: float = 0.95) -> Dict[str, Tuple[int, int]]:
+        """
+        :return: per stat, the (low, high) ranks bounding the central `level` of samples
+        """
+        alpha = (1 - level) / 2
+        hists = self.rank_hist[:, self._index[group]]
+        return {stat: (self._quantile(hists[s], alpha), self._quantile(hists[s], 1 - alpha))
+                for s, stat in enumerate(STATS)}
+
+    def median_ranks(self, group: Group) -> Dict[str, int]:
+        i = self._index[group]
+        return {stat: self._quantile(self.rank_hist[s, i], 0.5) for s, stat in enumerate(STATS)}
+
+    def threshold_probabilities(self, thresholds: List[int]) -> Dict[Group, Dict[int, float]]:
+        """
+        :return: per group, the probability of making the standings at each threshold, i.e. of all four
+        ranks being within the threshold
+        """
+        cumulative = numpy.cumsum(self.bucket_hist, axis=1) / self.samples
+        cols = numpy.minimum(thresholds, self.bucket_hist.shape[1] - 1)
+        return {group: dict(zip(thresholds, cumulative[i, cols].tolist()))
+                for i, group in enumerate(self.groups)}
+
+    def summary(self, thresholds: List[int], level: float = 0.95) -> Dict[Group, Dict[str, object]]:
+        probabilities = self.threshold_probabilities(thresholds)
+        return {
+            group: {
+                "median_ranks": self.median_ranks(group),
+                "rank_intervals": self.rank_interval(group, level),
+                "threshold_probabilities": probabilities[group],
+            }
+            for group in self.groups
+        }
+
+
+def bootstrap(view: CircuitView, samples: int = DEFAULT_SAMPLES, chunk: int = DEFAULT_CHUNK,
+              seed: int = None, processes: int = None, rank_method: str = None) -> BootstrapResult:
+    """
+    Estimates how stable each group's ranks are under judge noise: resamples the judges of every comp
+    in `view` with replacement `samples` times, and recomputes normalized scores, stats and ranks for
+    each sample. Samples are computed in vectorized chunks of `chunk` samples to bound memory. With
+    `processes`, chunks are spread over that many worker processes (0 or None runs in this process).
+    """
+    resampler = Resampler(view)
+    rank_method = rank_method or view.rank_method or RANK_METHOD
+    sizes = [min(chunk, samples - start) for start in range(0, samples, chunk)]
+    # One seed per chunk, so results don't depend on how chunks are spread over processes
+    seeds = numpy.random.SeedSequence(seed).spawn(len(sizes))
+
+    num_ranks = len(view.groups) + 1
+    rank_hist = numpy.zeros((len(STATS), len(view.groups), num_ranks), dtype=int)
+    bucket_hist = numpy.zeros((len(view.groups), num_ranks), dtype=int)
+
+    if processes:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            results = pool.map(simulate_chunk, [resampler] * len(sizes), seeds, sizes,
+                               [rank_method] * len(sizes))
+            for chunk_ranks, chunk_buckets in results:
+                rank_hist += chunk_ranks
+                bucket_hist += chunk_buckets
+    else:
+        for chunk_seed, size in zip(seeds, sizes):
+            chunk_ranks, chunk_buckets = simulate_chunk(resampler, chunk_seed, size, rank_method)
+            rank_hist += chunk_ranks
+            bucket_hist += chunk_buckets
+
+    return BootstrapResult(list(view.groups), samples, rank_hist, bucket_hist)
+
+
+if __name__ == '__main__':
+    year = "2018-19"
+    full = ViewCache().get_view(year, get_comps(-1, year))
+    result = bootstrap(full, samples=int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SAMPLES)
+    probabilities = result.threshold_probabilities([5, 10, 15])
+    print(tabulate([
+        (group, *(f"{lo}-{hi}" for lo, hi in result.rank_interval(group).values()),
+         *(round(p, 2) for p in probabilities[group].values()))
+        for group in full.select_groups(len(full.groups))
+    ], headers=["Group", "Abs Median", "Abs Mean", "Rel Median", "Rel Mean",
+                "P(<=5)", "P(<=10)", "P(<=15)"]))
@@ -0,0 +1,80 @@
+import json
+import os
+import pathlib
+import random
+import sys
+import time
+from typing import Hashable, List, Tuple
+
+import numpy
+
+from comp_score_mgr import LocalScoreManager, ScoreManager
+from util import Group, ScoresDict, SCORES_DIR
+
+
+def generate_season(root: str, year: str, num_groups: int, num_comps: int, num_judges: int,
+                    density: float = 0.3, seed: int = 0) -> List[str]:
+    """
+    Writes a synthetic season in LocalScoreManager's format: `root`/scores/`year`/details.json plus one
+    CSV per comp, with a row per group of its name followed by each judge's score.
+    :param density: probability of a group attending each comp (every comp gets at least 2 groups)
+    :return: the comps, in order
+    """
+    rng = random.Random(seed)
+    year_dir = os.path.join(root, SCORES_DIR, year)
+    pathlib.Path(year_dir).mkdir(parents=True, exist_ok=True)
+
+    groups = [f"Group_{n + 1}" for n in range(num_groups)]
+    # Each group has a true level; each judge a bias and a spread
+    levels = {group: rng.gauss(70, 8) for group in groups}
+    comps = [f"comp_{n + 1}" for n in range(num_comps)]
+
+    for comp in comps:
+        attending = [group for group in groups if rng.random() < density]
+        if len(attending) < 2:
+            attending = rng.sample(groups, min(2, num_groups))
+        judges = [(rng.gauss(0, 5), rng.uniform(0.7, 1.3)) for _ in range(num_judges)]
+
+        with open(os.path.join(year_dir, f"{comp}.csv"), 'w') as f:
+            for group in attending:
+                scores = [min(100.0, max(1.0, levels[group] * scale + bias + rng.gauss(0, 4)))
+                          for bias, scale in judges]
+                f.write(",".join([group] + [f"{score:.1f}" for score in scores]) + "\n")
+
+    with open(os.path.join(year_dir, "details.json"), 'w') as f:
+        json.dump({"order": comps}, f, indent=2)
+
+    return comps
+
+
+class LatencyScoreManager(ScoreManager):
+    """
+    Stand-in for a remote backend: serves local score files, but every fetch first waits `latency`
+    seconds (per comp, or drawn from `latencies`), like a round trip to a server.
+    """
+
+    def __init__(self, latency: float = 0.05, latencies: List[float] = None, seed: int = 0):
+        self.local = LocalScoreManager()
+        self.latency = latency
+        self.latencies = latencies
+        self.rng = random.Random(seed)
+
+    def delay(self) -> float:
+        return self.rng.choice(self.latencies) if self.latencies else self.latency
+
+    def get_score_matrix(self, year: str, name: str) -> Tuple[List[Group], numpy.ndarray]:
+        time.sleep(self.delay())
+        return self.local.get_score_matrix(year, name)
+
+    def get_raw_scores(self, year: str, name: str) -> Tuple[ScoresDict, int]:
+        time.sleep(self.delay())
+        return self.local.get_raw_scores(year, name)
+
+    def revision(self, year: str, name: str) -> Hashable:
+        return self.local.revision(year, name)
+
+
+if __name__ == '__main__':
+    # python synthetic.py root year groups comps judges [density]
+    generate_season(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]),
+                    float(sys.argv[6]) if len(sys.argv) > 6 else 0.3)
@@ -0,0 +1,129 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# Set to a file name to trace a run, e.g. OPS_TRACE=trace.json python report_generator.py
+TRACE_ENV = "OPS_TRACE"
+
+
+class Tracer:
+    """
+    Records nested stages as Chrome trace events (chrome://tracing, Perfetto), with the wall time, call
+    count and peak traced memory of every stage. Spans are no-ops while the tracer is disabled.
+    """
+
+    def __init__(self):
+        self.filename: str = None
+        self.events: List[Dict[str, Any]] = []
+        # name -> {"count", "total_ms", "peak_kb"}
+        self.summary: Dict[str, Dict[str, float]] = {}
+        # Per thread stack of the peak memory of the enclosing spans' children
+        self._local = threading.local()
+        self._start = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.filename is not None
+
+    def enable(self, filename: str):
+        """
+        Starts tracing; the trace is written to `filename` on exit (or by calling write).
+        """
+        if not self.enabled:
+            atexit.register(self.write)
+            self._start = time.perf_counter()
+        self.filename = filename
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _peaks(self) -> List[int]:
+        if not hasattr(self._local, "peaks"):
+            self._local.peaks = []
+        return self._local.peaks
+
+    @contextlib.contextmanager
+    def _span(self, name: str, args: Dict[str, Any]):
+        peaks = self._peaks()
+        # The peak so far belongs to the parent; restart it for this span
+        if peaks:
+            peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        peaks.append(0)
+
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+
+            self.events.append({
+                "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": (start - self._start) * 1e6, "dur": (end - start) * 1e6,
+                "args": {**args, "peak_kb": peak // 1024},
+            })
+            stage = self.summary.setdefault(name, {"count": 0, "total_ms": 0.0, "peak_kb": 0})
+            stage["count"] += 1
+            stage["total_ms"] += (end - start) * 1e3
+            stage["peak_kb"] = max(stage["peak_kb"], peak // 1024)
+
+    def span(self, name: str, **args: Any):
+        """
+        Context manager timing a stage. `args` are shown with the event in the trace viewer; the
+        yielded dictionary can be updated to add more, e.g. a return code.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext(args)
+        return self._span(name, args)
+
+    def write(self, filename: str = None):
+        filename = filename or self.filename
+        if filename is None:
+            return
+        with open(filename, 'w') as f:
+            json.dump({
+                "traceEvents": self.events,
+                "displayTimeUnit": "ms",
+                "otherData": {"summary": self.summary},
+            }, f)
+
+
+tracer = Tracer()
+if os.environ.get(TRACE_ENV):
+    tracer.enable(os.environ[TRACE_ENV])
+
+
+def span(name: str, **args: Any):
+    """
+    Times a stage with the module's tracer, e.g. `with span("normalize", comp=comp): ...`
+    """
+    return tracer.span(name, **args)
+
+
+def traced(name: str = None) -> Callable:
+    """
+    Decorator timing every call of a function as a stage, named after the function by default.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        stage = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
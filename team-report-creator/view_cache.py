@@ -0,0 +1,284 @@
+import glob
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import threading
+import weakref
+from typing import Dict, Hashable, List, Union
+
+import attendance
+import circuit_view
+import comp_score_mgr
+import ragged
+import running_stats
+import score_archive
+import season
+import view_format
+from circuit_view import CircuitView, RAW
+from comp_score_mgr import LocalScoreManager, ScoreManager
+from season import Season
+from tracing import span, traced
+
+# Bump to invalidate every entry, e.g. when the meaning of a stat changes without a code change here
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SEASON_EXT = ".season.npz"
+
+# Modules that parse scores or compute, rank or store views; a change to any of them invalidates the cache
+CODE_MODULES = (circuit_view, view_format, ragged, running_stats, attendance, comp_score_mgr, score_archive,
+                season)
+
+
+class ViewCache:
+    """
+    Cache of CircuitViews in the binary format, keyed by a hash of everything the view is computed from:
+    the year, the comps (in order) and their revisions from the score manager (e.g. digests of the score
+    files, or Drive versions of the sheets), and the code and format versions. Corrected scores or a
+    reordered details.json therefore never hit stale entries, whichever manager the scores come from.
+
+    Views only hold summaries and refer to comp files, each holding one comp's details keyed the same way
+    by the comp's revision, so the prefixes of a season (and views of other comp orders) share them.
+    Comp files are mapped once per cache and shared by every view loaded from it.
+
+    The cache is bounded to `max_bytes`; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory: str = "cache", max_bytes: int = DEFAULT_MAX_BYTES,
+                 score_mgr: ScoreManager = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Scores of the comps appended to views that aren't cached, and their revisions
+        self.score_mgr = score_mgr or LocalScoreManager()
+        self._code_digest = hashlib.sha256(b"".join(
+            pathlib.Path(module.__file__).read_bytes() for module in CODE_MODULES
+        )).hexdigest()
+        # path -> comp file, while views loaded from this cache use it
+        self._comp_files = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def key(self, year: str, comps: List[str], revisions: Dict[str, Hashable] = None) -> str:
+        """
+        :param revisions: revisions of (at least) `comps` if already looked up
+        """
+        if revisions is None:
+            revisions = self.score_mgr.revisions(year, comps)
+        for comp in comps:
+            if revisions[comp] is None:
+                raise Exception(f"Illegal argument: score_mgr has no revision of {comp}, so views can't be cached")
+
+        return hashlib.sha256(json.dumps([
+            CACHE_VERSION,
+            view_format.FORMAT_VERSION,
+            self._code_digest,
+            year,
+            [[comp, revisions[comp]] for comp in comps],
+        ]).encode()).hexdigest()
+
+    def comp_key(self, year: str, comp: str, revision: Hashable) -> str:
+        return hashlib.sha256(json.dumps([
+            CACHE_VERSION,
+            view_format.FORMAT_VERSION,
+            self._code_digest,
+            year,
+            comp,
+            revision,
+        ]).encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{view_format.EXT}")
+
+    def comp_path(self, year: str, comp: str, revision: Hashable) -> str:
+        return os.path.join(self.directory, f"{self.comp_key(year, comp, revision)}{view_format.COMP_EXT}")
+
+    def _open_comp(self, path: str) -> view_format.CompFile:
+        with self._lock:
+            comp_file = self._comp_files.get(path)
+            if comp_file is None:
+                comp_file = self._comp_files[path] = view_format.CompFile(path)
+            return comp_file
+
+    @traced()
+    def get(self, year: str, comps: List[str], revisions: Dict[str, Hashable] = None
+            ) -> Union[CircuitView, None]:
+        """
+        :return: the cached view, or None if it or one of its comp files isn't cached
+        """
+        if revisions is None:
+            revisions = self.score_mgr.revisions(year, comps)
+        path = self.path(self.key(year, comps, revisions))
+        if not os.path.exists(path):
+            return None
+
+        try:
+            # Mark as recently used, along with the comp files
+            for comp in comps:
+                os.utime(self.comp_path(year, comp, revisions[comp]))
+            os.utime(path)
+            view = view_format.load_view(path, open_comp=self._open_comp)
+        except FileNotFoundError:
+            # Evicted meanwhile
+            return None
+        view.score_mgr = self.score_mgr
+        return view
+
+    @traced()
+    def put(self, year: str, comps: List[str], view: CircuitView, evict: bool = True,
+            revisions: Dict[str, Hashable] = None):
+        """
+        :param revisions: revisions of the comps the view was built from, looked up now if not given
+        :param evict: whether to evict entries past `max_bytes` now; workers writing concurrently leave it
+        to their parent (see multi_year.process_years)
+        """
+        if revisions is None:
+            revisions = self.score_mgr.revisions(year, comps)
+        pathlib.Path(self.directory).mkdir(parents=True, exist_ok=True)
+
+        # Only comps that aren't cached yet (e.g. the last of a new prefix) have their details written
+        comp_files = {}
+        for comp in comps:
+            comp_path = self.comp_path(year, comp, revisions[comp])
+            comp_files[comp] = os.path.basename(comp_path)
+            if not os.path.exists(comp_path):
+                # Write under a temporary name so readers never see a partial file
+                tmp = f"{comp_path}.tmp{os.getpid()}"
+                view_format.save_comp(view.comp_details[comp], tmp)
+                os.replace(tmp, comp_path)
+
+        path = self.path(self.key(year, comps, revisions))
+        tmp = f"{path}.tmp{os.getpid()}"
+        view_format.save_view(view, tmp, comp_files)
+        os.replace(tmp, path)
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in `max_bytes`. Entries removed meanwhile
+        by another process are skipped.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((view_format.EXT, view_format.COMP_EXT, SEASON_EXT)):
+                try:
+                    entries.append((entry.path, entry.stat()))
+                except FileNotFoundError:
+                    pass
+        entries.sort(key=lambda entry: entry[1].st_mtime_ns)
+        total = sum(st.st_size for _, st in entries)
+        for path, st in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= st.st_size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @traced()
+    def get_season(self, year: str, comps: List[str]) -> Season:
+        """
+        :return: the rank progression over every prefix of `comps`, stored next to the full view
+        """
+        revisions = self.score_mgr.revisions(year, comps)
+        path = os.path.join(self.directory, f"{self.key(year, comps, revisions)}{SEASON_EXT}")
+        if os.path.exists(path):
+            os.utime(path)
+            return Season.load(path)
+
+        season = Season.from_views(self.get_prefix_views(year, comps, revisions))
+        pathlib.Path(self.directory).mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        season.save(tmp)
+        os.replace(tmp, path)
+        self.evict()
+
+        return season
+
+    def get_view(self, year: str, comps: List[str]) -> CircuitView:
+        """
+        :return: the view over `comps`, from the cache or processed (and then cached)
+        """
+        revisions = self.score_mgr.revisions(year, comps)
+        view = self.get(year, comps, revisions)
+        return view if view is not None else self.get_prefix_views(year, comps, revisions)[-1]
+
+    @traced()
+    def get_prefix_views(self, year: str, comps: List[str], revisions: Dict[str, Hashable] = None
+                         ) -> List[CircuitView]:
+        """
+        :return: one view per prefix of `comps`. Cached prefixes are reused; missing prefixes are built
+        by appending comps to one working view, as in CircuitView.process_prefixes, and snapshotting it.
+        """
+        # Every prefix's key uses the same revisions, so they're looked up once
+        if revisions is None:
+            revisions = self.score_mgr.revisions(year, comps)
+        cached = [self.get(year, comps[0:n], revisions) for n in range(1, len(comps) + 1)]
+        # Fetch the comps of every missing prefix at once
+        missing = [comp for comp, view in zip(comps, cached) if view is None]
+        with span("prefetch", comps=len(missing)):
+            matrices = self.score_mgr.get_many(year, missing, {comp: revisions[comp] for comp in missing})
+
+        views: List[CircuitView] = []
+        working: CircuitView = None
+        for n, view in enumerate(cached, 1):
+            if view is not None:
+                views.append(view)
+                working = None
+                continue
+
+            if working is None:
+                # Continues from the previous (cached) prefix; its running stats are built as needed
+                if views:
+                    working = views[-1].copy()
+                else:
+                    working = CircuitView(score_mgr=self.score_mgr)
+                    working.year = year
+            working.append_comp(comps[n - 1], matrices[comps[n - 1]], revisions[comps[n - 1]])
+            self.put(year, comps[0:n], working, revisions=revisions)
+            # Details of the cached file can't go stale like the score files, and its mapping outlives its
+            # eviction; the working view is only snapshot if the file was evicted before it could be read
+            snapshot = self.get(year, comps[0:n], revisions)
+            views.append(snapshot if snapshot is not None else working.copy())
+
+        # Details are loaded again from the score files or the views' mappings when needed
+        for view in views:
+            view.release_comp_details()
+
+        return views
+
+
+def import_json_cache(directory: str = "cache", cache: ViewCache = None) -> List[str]:
+    """
+    Imports the JSON views in `directory` (as written by `CircuitView.dump`, e.g. the `cache/<n>.json` of
+    earlier runs) into `cache`, the ViewCache in `directory` by default. JSON views don't record what they
+    were built from, so they're keyed by the revisions of the current scores and their stats are trusted
+    as legacy data; a view is only imported if the raw scores of all its comps still match the current
+    scores. The JSON files are left in place.
+    :return: the JSON files imported
+    """
+    cache = cache or ViewCache(directory)
+    imported = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        view = CircuitView.load(filename)
+        revisions = cache.score_mgr.revisions(view.year, view.comps)
+        matrices = cache.score_mgr.get_many(view.year, view.comps, revisions)
+        changed = [comp for comp in view.comps
+                   if view.comp_details[comp][RAW] != dict(zip(matrices[comp][0], matrices[comp][1].tolist()))]
+        if changed:
+            print(filename, "skipped, the scores of", ", ".join(changed), "changed")
+            continue
+
+        cache.put(view.year, view.comps, view, revisions=revisions)
+        imported.append(filename)
+        print(filename, "->", cache.path(cache.key(view.year, view.comps, revisions)))
+
+    return imported
+
+
+if __name__ == '__main__':
+    # python view_cache.py [directory]: imports the JSON views of earlier runs
+    import_json_cache(sys.argv[1] if len(sys.argv) > 1 else "cache")
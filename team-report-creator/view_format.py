@@ -0,0 +1,232 @@
+import json
+import os
+import struct
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy
+
+from attendance import AttendanceIndex
+from circuit_view import CircuitView, LazyCompDetails, Leaderboard, RAW, NORMAL
+from util import Group
+
+# File layout:
+#   MAGIC | version (u32) | header length (u32) | JSON header | padding | array blocks
+# The header holds the non-numeric fields and the dtype, shape and offset (relative to the start of the
+# first block) of every array. Blocks are aligned so they can be memory-mapped directly.
+# A view file either holds the details of its comps, or refers to comp files (COMP_MAGIC, same layout)
+# that hold one comp's details each, so views sharing comps can share their files.
+MAGIC = b"CVIEW\0\0\0"
+COMP_MAGIC = b"CCOMP\0\0\0"
+FORMAT_VERSION = 3
+EXT = ".cview"
+COMP_EXT = ".ccomp"
+ALIGN = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _details_arrays(details: Dict[str, Any]) -> Tuple[List[Group], Dict[str, numpy.ndarray]]:
+    """
+    Converts one competition's details to arrays.
+    :return: the comp's groups, in the order of the arrays' rows, and the arrays
+    """
+    groups = list(details[RAW].keys())
+    num_judges = len(details["judge_avgs"])
+    shape = (len(groups), num_judges)
+
+    return groups, {
+        RAW: numpy.array([details[RAW][group] for group in groups], dtype=float).reshape(shape),
+        NORMAL: numpy.array([details[NORMAL][group] for group in groups], dtype=float).reshape(shape),
+        "final_scores": numpy.array([details["final_scores"][group] for group in groups], dtype=float),
+        "judge_avgs": numpy.array(details["judge_avgs"], dtype=float),
+    }
+
+
+def _write(filename: str, magic: bytes, fields: Dict[str, Any], arrays: Dict[str, numpy.ndarray]):
+    layout: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({**fields, "arrays": layout}).encode()
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    with open(filename, 'wb') as f:
+        f.write(_PREAMBLE.pack(magic, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(numpy.ascontiguousarray(array).tobytes())
+        # Make sure trailing padding exists so every block lies within the file
+        f.truncate(data_start + offset)
+
+
+def read_header(filename: str, magic: bytes = MAGIC) -> Tuple[Dict[str, Any], int]:
+    """
+    Reads the header of a binary view (or, with COMP_MAGIC, comp) file.
+    :return: header dict and the file offset of the first array block
+    """
+    with open(filename, 'rb') as f:
+        file_magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if file_magic != magic:
+            raise Exception(f"{filename} is not a {'CircuitView' if magic == MAGIC else 'comp'} file")
+        if version != FORMAT_VERSION:
+            raise Exception(f"{filename} has unsupported format version {version}")
+        header = json.loads(f.read(header_len))
+
+    return header, _align(_PREAMBLE.size + header_len)
+
+
+def _read_data(filename: str, data_start: int, mmap: bool) -> numpy.ndarray:
+    """
+    :return: the array blocks of a file as one buffer, memory-mapped read-only or read whole. Arrays are
+    sliced from it, so the file is only opened once and can be deleted afterwards.
+    """
+    if os.path.getsize(filename) <= data_start:
+        return None
+    if mmap:
+        return numpy.memmap(filename, dtype=numpy.uint8, mode='r', offset=data_start)
+    with open(filename, 'rb') as f:
+        f.seek(data_start)
+        return numpy.fromfile(f, dtype=numpy.uint8)
+
+
+def _array(header: Dict[str, Any], data: numpy.ndarray, name: str) -> numpy.ndarray:
+    spec = header["arrays"][name]
+    dtype = numpy.dtype(spec["dtype"])
+    shape = tuple(spec["shape"])
+    if int(numpy.prod(shape)) == 0:
+        return numpy.zeros(shape, dtype=dtype)
+    return numpy.ndarray(shape, dtype=dtype, buffer=data, offset=spec["offset"])
+
+
+def save_comp(details: Dict[str, Any], filename: str):
+    """
+    Saves one competition's details in the binary format, for views saved with `comp_files`.
+    """
+    groups, arrays = _details_arrays(details)
+    _write(filename, COMP_MAGIC, {"groups": groups, "max": float(details["max"]),
+                                  "min": float(details["min"])}, arrays)
+
+
+class CompFile:
+    """
+    A competition's details saved by `save_comp`, opened (with `mmap`, memory-mapped) once. Details are
+    built from that buffer on every call, so views sharing the file share it, and can still read it after
+    the file is deleted.
+    """
+
+    def __init__(self, filename: str, mmap=True):
+        self.filename = filename
+        self.header, data_start = read_header(filename, COMP_MAGIC)
+        self.data = _read_data(filename, data_start, mmap)
+
+    def details(self) -> Dict[str, Any]:
+        groups = self.header["groups"]
+        return {
+            RAW: dict(zip(groups, _array(self.header, self.data, RAW).tolist())),
+            NORMAL: dict(zip(groups, _array(self.header, self.data, NORMAL).tolist())),
+            "final_scores": dict(zip(groups, _array(self.header, self.data, "final_scores").tolist())),
+            "max": self.header["max"],
+            "min": self.header["min"],
+            "judge_avgs": _array(self.header, self.data, "judge_avgs").tolist(),
+        }
+
+
+def save_view(view: CircuitView, filename: str, comp_files: Dict[str, str] = None):
+    """
+    Saves a view in the binary format.
+    :param comp_files: comp -> name of the file (in the view file's directory) its details were saved
+    to by `save_comp`; the view then refers to those files instead of holding its comps' details
+    """
+    arrays: Dict[str, numpy.ndarray] = {
+        "stats": view._stats,
+        "ranks": view._ranks,
+        "attendance": view._attendance.matrix(),
+    }
+    comp_extremes = {}
+    if comp_files is None:
+        for i, comp in enumerate(view.comps):
+            groups, comp_arrays = _details_arrays(view.comp_details[comp])
+            # Groups are stored as row numbers of the view
+            arrays[f"comps/{i}/groups"] = numpy.array([view._index[group] for group in groups], dtype=numpy.int32)
+            for key, array in comp_arrays.items():
+                arrays[f"comps/{i}/{key}"] = array
+            comp_extremes[comp] = [float(view.comp_details[comp]["max"]),
+                                   float(view.comp_details[comp]["min"])]
+
+    _write(filename, MAGIC, {
+        "year": view.year,
+        "comps": view.comps,
+        "groups": view.groups,
+        "comp_extremes": comp_extremes,
+        "comp_files": comp_files,
+        "avg_groups_per_comp": float(view.avg_groups_per_comp),
+        "avg_judges_per_comp": float(view.avg_judges_per_comp),
+        "avg_comps_per_group": float(view.avg_comps_per_group),
+        "leaderboards": {kind: leaderboard.top() for kind, leaderboard in view.leaderboards.items()},
+        "rank_method": view.rank_method,
+    }, arrays)
+
+
+def load_view(filename: str, mmap=True, open_comp: Callable[[str], CompFile] = None) -> CircuitView:
+    """
+    Loads a view saved by `save_view`. With `mmap`, the file is memory-mapped read-only, so only the
+    parts that are used get read from disk; otherwise it's read whole. Either way the file is opened once
+    and every array is a slice of that one buffer, so competition details (built on first access) can
+    still be read after the file is deleted, e.g. evicted from a ViewCache. The comp files a view refers
+    to are opened now, for the same reason.
+    :param open_comp: opens a comp file by path, e.g. sharing CompFiles between views; a new CompFile
+    by default
+    """
+    header, data_start = read_header(filename)
+    data = _read_data(filename, data_start, mmap)
+
+    def array(name: str) -> numpy.ndarray:
+        return _array(header, data, name)
+
+    cv = CircuitView(header.get("rank_method", "ordinal"))
+    cv.year = header["year"]
+    cv.comps = header["comps"]
+    cv._set_groups(header["groups"])
+    # Stats and ranks are copied as append_comp resizes them
+    cv._stats = numpy.array(array("stats"))
+    cv._ranks = numpy.array(array("ranks"))
+    cv._attendance = AttendanceIndex.from_matrix(array("attendance"))
+    cv.avg_groups_per_comp = header["avg_groups_per_comp"]
+    cv.avg_judges_per_comp = header["avg_judges_per_comp"]
+    cv.avg_comps_per_group = header["avg_comps_per_group"]
+    cv.leaderboards = {kind: Leaderboard(entries=entries, comps=cv.comps)
+                       for kind, entries in header["leaderboards"].items()}
+
+    def comp_loader(i: int, comp: str):
+        def load_comp() -> Dict[str, Any]:
+            groups = [cv.groups[g] for g in array(f"comps/{i}/groups")]
+            comp_max, comp_min = header["comp_extremes"][comp]
+            return {
+                RAW: dict(zip(groups, array(f"comps/{i}/{RAW}").tolist())),
+                NORMAL: dict(zip(groups, array(f"comps/{i}/{NORMAL}").tolist())),
+                "final_scores": dict(zip(groups, array(f"comps/{i}/final_scores").tolist())),
+                "max": comp_max,
+                "min": comp_min,
+                "judge_avgs": array(f"comps/{i}/judge_avgs").tolist(),
+            }
+
+        return load_comp
+
+    if header["comp_files"] is None:
+        loaders = {comp: comp_loader(i, comp) for i, comp in enumerate(cv.comps)}
+    else:
+        open_comp = open_comp or (lambda path: CompFile(path, mmap))
+        directory = os.path.dirname(filename)
+        loaders = {comp: open_comp(os.path.join(directory, header["comp_files"][comp])).details
+                   for comp in cv.comps}
+    cv.comp_details = LazyCompDetails(loaders)
+
+    return cv
+